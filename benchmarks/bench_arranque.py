@@ -0,0 +1,116 @@
+"""
+Tiempo de arranque en frío: cada escenario corre varias veces en un intérprete nuevo y mide
+el tiempo total del proceso (con el arranque de Python) y el de la parte que interesa dentro
+de él. Es lo que paga una instancia recién escalada antes de responder su primer /healthz o
+su primer reporte.
+
+    python benchmarks/bench_arranque.py
+    python benchmarks/bench_arranque.py -n 10 --importtime 15    # además, los módulos más lentos de create_app
+    python benchmarks/bench_arranque.py --guardar antes.json
+    python benchmarks/bench_arranque.py --comparar antes.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import comun
+
+# El hijo imprime en la última línea los segundos de la parte medida
+_MEDIR = """
+import json, time
+inicio = time.perf_counter()
+{codigo}
+print(json.dumps(time.perf_counter() - inicio))
+"""
+
+_PRIMER_REPORTE = """
+from myapp import create_app
+cliente = create_app().test_client()
+respuesta = cliente.post('/rellenar_excel_salud', json={'FORMULARIO': {'userName': 'Arranque'}})
+assert respuesta.status_code == 200, respuesta.status_code
+"""
+
+# nombre -> (código medido, variables de entorno)
+ESCENARIOS = {
+    'python -c pass': ('pass', {}),
+    'import myapp': ('import myapp', {}),
+    'cli --help': ("import runpy, sys\nsys.argv = ['myapp', '--help']\ntry:\n    runpy.run_module('myapp', run_name='__main__')\nexcept SystemExit:\n    pass", {}),
+    'create_app': ('from myapp import create_app\ncreate_app()', {'CALENTAR_AL_INICIAR': '0'}),
+    'primer /healthz': ("from myapp import create_app\nassert create_app().test_client().get('/healthz').status_code == 200",
+                        {'CALENTAR_AL_INICIAR': '0'}),
+    'create_app calentando': ('from myapp import create_app\ncreate_app()', {'CALENTAR_AL_INICIAR': '1'}),
+    'primer reporte': (_PRIMER_REPORTE, {'CALENTAR_AL_INICIAR': '0'}),
+}
+
+
+def correr(codigo, entorno):
+    """Devuelve (segundos del proceso completo, segundos de la parte medida)"""
+    env = dict(os.environ, RESULTADOS_CACHE_TTL='0', LOG_LEVEL='ERROR', **entorno)
+    inicio = time.perf_counter()
+    salida = subprocess.run([sys.executable, '-c', _MEDIR.format(codigo=codigo)], cwd=comun.RAIZ, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return time.perf_counter() - inicio, json.loads(salida.strip().splitlines()[-1])
+
+
+def modulos_lentos(cantidad):
+    """Los `cantidad` módulos con más tiempo acumulado de importación al crear la app"""
+    env = dict(os.environ, CALENTAR_AL_INICIAR='0')
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from myapp import create_app; create_app()'],
+                            cwd=comun.RAIZ, env=env, capture_output=True, text=True, check=True).stderr
+    filas = []
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        propio, acumulado, modulo = linea[len('import time:'):].split('|')
+        filas.append((int(acumulado), int(propio), modulo.strip()))
+    return sorted(filas, reverse=True)[:cantidad]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--repeticiones', type=int, default=5)
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS), help='escenarios a correr, separados por coma')
+    parser.add_argument('--importtime', type=int, default=0, metavar='N',
+                        help='muestra los N módulos que más tardan en importarse al crear la app')
+    parser.add_argument('--guardar', help='guarda los resultados en este JSON')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para comparar el p50')
+    args = parser.parse_args()
+
+    escenarios = args.escenarios.split(',')
+    desconocidos = [nombre for nombre in escenarios if nombre not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+
+    base = {}
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = {r['escenario']: r for r in json.load(archivo)['resultados']}
+
+    resultados = []
+    print(f"{'escenario':<24}{'proceso p50':>13}{'medido p50':>12}{'medido max':>12}" + ('   p50 vs base' if base else ''))
+    for nombre in escenarios:
+        codigo, entorno = ESCENARIOS[nombre]
+        corridas = [correr(codigo, entorno) for _ in range(args.repeticiones)]
+        proceso = comun.resumen([total for total, _ in corridas])
+        medido = comun.resumen([parte for _, parte in corridas])
+        resultados.append({'escenario': nombre, 'proceso': proceso, 'medido': medido})
+        linea = f"{nombre:<24}{proceso['p50'] * 1000:>10.0f} ms{medido['p50'] * 1000:>9.0f} ms{medido['max'] * 1000:>9.0f} ms"
+        if nombre in base:
+            linea += f"   {medido['p50'] / base[nombre]['medido']['p50']:>6.2f}x"
+        print(linea, flush=True)
+
+    if args.importtime:
+        print(f"\n{'módulo':<48}{'acumulado ms':>14}{'propio ms':>11}")
+        for acumulado, propio, modulo in modulos_lentos(args.importtime):
+            print(f"{modulo:<48}{acumulado / 1000:>14.1f}{propio / 1000:>11.1f}")
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump({'opciones': vars(args), 'resultados': resultados}, archivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Benchmark de los tres generadores (procesar_excel, procesar_excel_dinamico, procesar_excel_salud).
+
+Cada escenario (tipo de reporte x tamaño de payload) corre en un proceso nuevo, así el pico de
+RSS y las caches son solo suyos. Las firmas y el logo salen de un servidor HTTP local con la
+latencia que se indique. Reporta percentiles de latencia, reportes por segundo, pico de RSS y
+percentiles de cada etapa (las mismas que expone /metrics; descarga y redimension suman el
+tiempo de todos los hilos de imágenes, por eso pueden pasar la latencia total).
+
+Con --memoria además mide con tracemalloc el pico de memoria de cada etapa: lo asignado por
+encima de lo que había al empezarla, en todo el proceso (incluye los hilos de imágenes).
+tracemalloc hace todo más lento: las latencias de esa corrida no sirven para comparar.
+
+    python benchmarks/bench_reportes.py
+    python benchmarks/bench_reportes.py -n 50 --latencia 80 --imagenes frias --guardar antes.json
+    python benchmarks/bench_reportes.py -n 50 --latencia 80 --imagenes frias --comparar antes.json
+    python benchmarks/bench_reportes.py --motor openpyxl --guardar openpyxl.json
+    python benchmarks/bench_reportes.py --motor xml --comparar openpyxl.json
+    python benchmarks/bench_reportes.py -n 5 --tamanos grande --memoria
+"""
+import argparse
+import copy
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import comun
+
+GENERADORES = {
+    'preoperacional': ('myapp.services.excel_service', 'procesar_excel'),
+    'limpieza': ('myapp.services.limpieza_service', 'procesar_excel_dinamico'),
+    'salud': ('myapp.services.salud_service', 'procesar_excel_salud'),
+}
+
+
+def correr_escenario(tipo, tamano, url_base, opciones):
+    """Se ejecuta en un proceso hijo: genera el reporte `iteraciones` veces y devuelve las mediciones"""
+    # Caches de disco propias del escenario: no se mezclan con las de otras corridas
+    os.environ['IMAGEN_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench_imagenes_')
+    if opciones['motor']:
+        os.environ['MOTOR_PLANTILLAS'] = opciones['motor']
+    import importlib
+    from myapp.services import metricas
+
+    inicio_import = time.perf_counter()
+    modulo, funcion = GENERADORES[tipo]
+    generar = getattr(importlib.import_module(modulo), funcion)
+    import_s = time.perf_counter() - inicio_import
+    rss_inicial = comun.rss_pico_mb()
+
+    items = comun.items_preoperacional() if tipo == 'preoperacional' else None
+    if opciones['memoria']:
+        tracemalloc.start()
+
+    def payload(i):
+        # Imágenes frías: una URL distinta por iteración obliga a descargar y redimensionar cada vez
+        variante = i if opciones['imagenes'] == 'frias' else None
+        if tipo == 'preoperacional':
+            return comun.payload_preoperacional(tamano, url_base, variante, items)
+        return comun.PAYLOADS[tipo](tamano, url_base, variante)
+
+    def una_vez(i):
+        data = payload(i)
+        metricas.iniciar_medicion(memoria=opciones['memoria'])
+        inicio = time.perf_counter()
+        excel_buffer = generar(data, opciones['demo'])
+        duracion = time.perf_counter() - inicio
+        return duracion, dict(metricas.medicion_actual()), len(excel_buffer.getvalue()), dict(metricas.memoria_actual())
+
+    for i in range(opciones['calentamiento']):
+        una_vez(-1 - i)
+
+    inicio = time.perf_counter()
+    if opciones['hilos'] > 1:
+        with ThreadPoolExecutor(max_workers=opciones['hilos']) as executor:
+            resultados = list(executor.map(una_vez, range(opciones['iteraciones'])))
+    else:
+        resultados = [una_vez(i) for i in range(opciones['iteraciones'])]
+    total_s = time.perf_counter() - inicio
+
+    etapas = {}
+    memoria = {}
+    for _, medicion, _, picos in resultados:
+        for etapa, segundos in medicion.items():
+            etapas.setdefault(etapa, []).append(segundos)
+        for etapa, pico in picos.items():
+            memoria.setdefault(etapa, []).append(pico / (1024 * 1024))
+
+    return {
+        'tipo': tipo,
+        'tamano': tamano,
+        'latencia': comun.resumen([duracion for duracion, *_ in resultados]),
+        'reportes_por_s': len(resultados) / total_s if total_s else float('nan'),
+        'bytes_xlsx': resultados[-1][2] if resultados else 0,
+        'import_s': import_s,
+        'rss_inicial_mb': rss_inicial,
+        'rss_pico_mb': comun.rss_pico_mb(),
+        'etapas': {etapa: comun.resumen(valores) for etapa, valores in etapas.items()},
+        'memoria_etapas_mb': {etapa: comun.resumen(valores) for etapa, valores in memoria.items()},
+    }
+
+
+def ms(segundos):
+    return f"{segundos * 1000:8.1f}"
+
+
+def imprimir(resultados, base=None):
+    base = {(r['tipo'], r['tamano']): r for r in (base or [])}
+    print(f"\n{'escenario':<24}{'n':>5}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'rep/s':>8}{'RSS MB':>8}{'xlsx KB':>9}" + ('   p50 vs base' if base else ''))
+    for r in resultados:
+        lat = r['latencia']
+        linea = (f"{r['tipo'] + '/' + r['tamano']:<24}{lat['n']:>5}{ms(lat['p50']):>9}{ms(lat['p90']):>9}"
+                 f"{ms(lat['p99']):>9}{ms(lat['max']):>9}{r['reportes_por_s']:>8.1f}{r['rss_pico_mb']:>8.0f}"
+                 f"{r['bytes_xlsx'] / 1024:>9.1f}")
+        anterior = base.get((r['tipo'], r['tamano']))
+        if anterior:
+            linea += f"   {lat['p50'] / anterior['latencia']['p50']:>6.2f}x"
+        print(linea)
+
+    print(f"\n{'escenario':<24}{'etapa':<13}{'p50 ms':>9}{'p99 ms':>9}")
+    for r in resultados:
+        for etapa, resumen in sorted(r['etapas'].items(), key=lambda e: -e[1]['p50']):
+            print(f"{r['tipo'] + '/' + r['tamano']:<24}{etapa:<13}{ms(resumen['p50']):>9}{ms(resumen['p99']):>9}")
+
+    if any(r.get('memoria_etapas_mb') for r in resultados):
+        print(f"\n{'escenario':<24}{'etapa':<13}{'pico MB p50':>12}{'pico MB max':>12}")
+        for r in resultados:
+            for etapa, resumen in sorted(r.get('memoria_etapas_mb', {}).items(), key=lambda e: -e[1]['max']):
+                print(f"{r['tipo'] + '/' + r['tamano']:<24}{etapa:<13}{resumen['p50']:>12.2f}{resumen['max']:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-n', '--iteraciones', type=int, default=20)
+    parser.add_argument('--calentamiento', type=int, default=2, help='iteraciones previas que no se miden')
+    parser.add_argument('--tipos', default=','.join(GENERADORES), help='preoperacional,limpieza,salud')
+    parser.add_argument('--tamanos', default=','.join(comun.TAMANOS), help='pequeno,mediano,grande')
+    parser.add_argument('--latencia', type=float, default=0, help='ms de espera del servidor de imágenes')
+    parser.add_argument('--imagenes', choices=['calientes', 'frias'], default='calientes',
+                        help='frias: URL distinta en cada iteración para no usar la cache de imágenes')
+    parser.add_argument('--hilos', type=int, default=1, help='reportes generados a la vez dentro del proceso')
+    parser.add_argument('--motor', choices=['openpyxl', 'xml'],
+                        help='motor de relleno para todas las plantillas (por defecto el de cada JSON)')
+    parser.add_argument('--demo', action='store_true', help='usar el modo demo (rutas _alt)')
+    parser.add_argument('--memoria', action='store_true',
+                        help='pico de memoria por etapa con tracemalloc (más lento: no comparar latencias)')
+    parser.add_argument('--guardar', help='guarda los resultados en este JSON')
+    parser.add_argument('--comparar', help='JSON de una corrida anterior para comparar el p50')
+    args = parser.parse_args()
+
+    servidor, url_base = comun.iniciar_servidor_imagenes(args.latencia)
+    opciones = {
+        'iteraciones': args.iteraciones,
+        'calentamiento': args.calentamiento,
+        'imagenes': args.imagenes,
+        'hilos': args.hilos,
+        'demo': args.demo,
+        'motor': args.motor,
+        'memoria': args.memoria,
+    }
+
+    resultados = []
+    contexto = multiprocessing.get_context('spawn')
+    try:
+        for tipo in args.tipos.split(','):
+            for tamano in args.tamanos.split(','):
+                with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as proceso:
+                    resultado = proceso.submit(correr_escenario, tipo, tamano, url_base, copy.deepcopy(opciones)).result()
+                resultados.append(resultado)
+                print(f"{tipo}/{tamano}: p50 {resultado['latencia']['p50'] * 1000:.1f} ms", flush=True)
+    finally:
+        servidor.shutdown()
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as archivo:
+            base = json.load(archivo)['resultados']
+    imprimir(resultados, base)
+
+    if args.guardar:
+        with open(args.guardar, 'w', encoding='utf-8') as archivo:
+            json.dump({'opciones': vars(args), 'resultados': resultados}, archivo, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+Prueba de carga de extremo a extremo contra las rutas reales de la aplicación (create_app).
+
+Por cada configuración de gunicorn (workers x threads) levanta el servidor, y por cada nivel de
+concurrencia lanza N clientes que envían peticiones sin pausa durante unos segundos. Reporta
+peticiones por segundo y percentiles de latencia, es decir, la curva throughput vs p99 con la
+que se dimensiona el despliegue. Las firmas salen del servidor local de imágenes de comun.py.
+
+    python benchmarks/carga.py
+    python benchmarks/carga.py --configs 1x1,2x4,4x2 --concurrencia 1,4,16,32 --duracion 20 --csv carga.csv
+    python benchmarks/carga.py --servidor flask            # sin gunicorn (p. ej. en Windows)
+    python benchmarks/carga.py --url https://mi-despliegue  # contra un servidor ya levantado
+"""
+import argparse
+import copy
+import csv
+import itertools
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+import comun
+
+# ruta -> tipo de payload sintético
+RUTAS = {
+    '/rellenar_excel': 'preoperacional',
+    '/rellenar_excel_limpieza': 'limpieza',
+    '/rellenar_excel_salud': 'salud',
+    '/rellenar_excel_alt': 'preoperacional',
+    '/rellenar_excel_limpieza_alt': 'limpieza',
+    '/rellenar_excel_salud_alt': 'salud',
+}
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def esperar_servidor(url, proceso=None, limite_s=60):
+    fin = time.monotonic() + limite_s
+    while time.monotonic() < fin:
+        if proceso is not None and proceso.poll() is not None:
+            raise RuntimeError(f"El servidor terminó con código {proceso.returncode}")
+        try:
+            if requests.get(f"{url}/metrics", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"El servidor no respondió en {limite_s} s")
+
+
+def entorno_servidor(args):
+    entorno = dict(os.environ)
+    if not args.con_cache:
+        # Sin cache de resultados: cada petición genera el xlsx completo
+        entorno['RESULTADOS_CACHE_TTL'] = '0'
+    return entorno
+
+
+def levantar_gunicorn(workers, hilos, args):
+    puerto = puerto_libre()
+    comando = [
+        sys.executable, '-m', 'gunicorn',
+        '--workers', str(workers), '--threads', str(hilos),
+        '--bind', f"127.0.0.1:{puerto}", '--timeout', '120', '--log-level', 'warning',
+        'myapp:create_app()',
+    ]
+    proceso = subprocess.Popen(comando, cwd=comun.RAIZ, env=entorno_servidor(args))
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        esperar_servidor(url, proceso)
+    except Exception:
+        proceso.terminate()
+        raise
+    return proceso, url
+
+
+def levantar_flask(args):
+    """Servidor WSGI con hilos dentro de este mismo proceso (referencia sin gunicorn)"""
+    if not args.con_cache:
+        os.environ['RESULTADOS_CACHE_TTL'] = '0'
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from myapp import create_app
+
+    class ManejadorSilencioso(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    servidor = make_server('127.0.0.1', 0, create_app(), threaded=True, request_handler=ManejadorSilencioso)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.server_port}"
+    esperar_servidor(url)
+    return servidor, url
+
+
+def generar_payloads(rutas, args, url_imagenes):
+    """Un payload base por ruta; en modo imágenes frías cada petición cambia la variante de las URLs"""
+    items = comun.items_preoperacional() if any(RUTAS[r] == 'preoperacional' for r in rutas) else None
+
+    def payload(ruta, variante):
+        tipo = RUTAS[ruta]
+        if tipo == 'preoperacional':
+            return comun.payload_preoperacional(args.tamano, url_imagenes, variante, items)
+        return comun.PAYLOADS[tipo](args.tamano, url_imagenes, variante)
+
+    if args.imagenes == 'frias':
+        return payload
+    fijos = {ruta: payload(ruta, None) for ruta in rutas}
+    return lambda ruta, variante: copy.deepcopy(fijos[ruta])
+
+
+def medir_nivel(url, rutas, payload, concurrencia, duracion_s, calentamiento_s):
+    """Lanza `concurrencia` clientes sin pausa entre peticiones y mide solo después del calentamiento"""
+    contador = itertools.count()
+    latencias = []
+    errores = []
+    lock = threading.Lock()
+    inicio = time.monotonic()
+    inicio_medicion = inicio + calentamiento_s
+    fin = inicio_medicion + duracion_s
+
+    def cliente(indice):
+        sesion = requests.Session()
+        while True:
+            numero = next(contador)
+            ruta = rutas[(numero + indice) % len(rutas)]
+            data = payload(ruta, numero)
+            antes = time.monotonic()
+            if antes >= fin:
+                return
+            try:
+                respuesta = sesion.post(f"{url}{ruta}", json=data, timeout=120)
+                ok = respuesta.status_code == 200
+            except requests.RequestException:
+                ok = False
+            despues = time.monotonic()
+            if antes >= inicio_medicion and despues <= fin:
+                with lock:
+                    (latencias if ok else errores).append(despues - antes)
+
+    hilos = [threading.Thread(target=cliente, args=(i,)) for i in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    resumen = comun.resumen(latencias)
+    resumen['rps'] = len(latencias) / duracion_s
+    resumen['errores'] = len(errores)
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--servidor', choices=['gunicorn', 'flask'], default='gunicorn')
+    parser.add_argument('--url', help='probar un servidor ya levantado en vez de iniciar uno')
+    parser.add_argument('--configs', default='1x1,2x2,4x1',
+                        help='configuraciones de gunicorn como workersxthreads, separadas por coma')
+    parser.add_argument('--concurrencia', default='1,2,4,8,16', help='clientes simultáneos a probar')
+    parser.add_argument('--duracion', type=float, default=10, help='segundos medidos por nivel')
+    parser.add_argument('--calentamiento', type=float, default=2, help='segundos previos que no se miden')
+    parser.add_argument('--rutas', default=','.join(RUTAS), help='rutas a usar, en rotación')
+    parser.add_argument('--tamano', choices=list(comun.TAMANOS), default='mediano')
+    parser.add_argument('--latencia', type=float, default=50, help='ms de espera del servidor de imágenes')
+    parser.add_argument('--imagenes', choices=['calientes', 'frias'], default='calientes')
+    parser.add_argument('--con-cache', action='store_true',
+                        help='dejar activa la cache de resultados (por defecto se desactiva)')
+    parser.add_argument('--csv', help='guarda las filas (config, concurrencia, rps, percentiles) en este CSV')
+    args = parser.parse_args()
+
+    rutas = args.rutas.split(',')
+    desconocidas = [ruta for ruta in rutas if ruta not in RUTAS]
+    if desconocidas:
+        parser.error(f"Rutas desconocidas: {', '.join(desconocidas)}")
+    niveles = [int(nivel) for nivel in args.concurrencia.split(',')]
+
+    servidor_imagenes, url_imagenes = comun.iniciar_servidor_imagenes(args.latencia)
+    payload = generar_payloads(rutas, args, url_imagenes)
+
+    if args.url:
+        configs = [('externo', None)]
+    elif args.servidor == 'flask':
+        configs = [('flask', None)]
+    else:
+        configs = [(config, tuple(int(n) for n in config.split('x'))) for config in args.configs.split(',')]
+
+    filas = []
+    print(f"{'config':<10}{'clientes':>9}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'errores':>9}")
+    try:
+        for nombre, workers_hilos in configs:
+            servidor = None
+            if args.url:
+                url = args.url.rstrip('/')
+            elif workers_hilos is None:
+                servidor, url = levantar_flask(args)
+            else:
+                servidor, url = levantar_gunicorn(*workers_hilos, args)
+
+            try:
+                for nivel in niveles:
+                    r = medir_nivel(url, rutas, payload, nivel, args.duracion, args.calentamiento)
+                    filas.append({'config': nombre, 'clientes': nivel, **r})
+                    print(f"{nombre:<10}{nivel:>9}{r['rps']:>9.1f}{r['p50'] * 1000:>9.0f}"
+                          f"{r['p90'] * 1000:>9.0f}{r['p99'] * 1000:>9.0f}{r['errores']:>9}", flush=True)
+            finally:
+                if isinstance(servidor, subprocess.Popen):
+                    servidor.terminate()
+                    servidor.wait(timeout=30)
+                elif servidor is not None:
+                    servidor.shutdown()
+    finally:
+        servidor_imagenes.shutdown()
+
+    # La mejor configuración por throughput con su p99, para leer la curva de un vistazo
+    for nombre in dict.fromkeys(fila['config'] for fila in filas):
+        mejor = max((fila for fila in filas if fila['config'] == nombre), key=lambda fila: fila['rps'])
+        print(f"{nombre}: máximo {mejor['rps']:.1f} req/s con {mejor['clientes']} clientes (p99 {mejor['p99'] * 1000:.0f} ms)")
+
+    if args.csv:
+        with open(args.csv, 'w', newline='', encoding='utf-8') as archivo:
+            escritor = csv.DictWriter(archivo, fieldnames=['config', 'clientes', 'rps', 'n', 'p50', 'p90', 'p99', 'max', 'errores'])
+            escritor.writeheader()
+            escritor.writerows(filas)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Compara lo que generan los dos motores de relleno (openpyxl y xml) para cada plantilla: valores,
+formato numérico y estilos de cada celda, celdas combinadas, anchos y altos, e imágenes (ancla,
+tamaño y contenido). Cada motor corre en un proceso nuevo con MOTOR_PLANTILLAS fijado y con los
+mismos payloads de bench_reportes.py. Termina con código 1 si encuentra alguna diferencia, así
+sirve para revisar un cambio de plantilla o de layout antes de usar "motor": "xml".
+
+    python benchmarks/comparar_motores.py
+    python benchmarks/comparar_motores.py --tipos salud --tamanos grande -v
+"""
+import argparse
+import hashlib
+import io
+import multiprocessing
+import os
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import comun
+
+GENERADORES = {
+    'preoperacional': ('myapp.services.excel_service', 'procesar_excel'),
+    'limpieza': ('myapp.services.limpieza_service', 'procesar_excel_dinamico'),
+    'salud': ('myapp.services.salud_service', 'procesar_excel_salud'),
+}
+MOTORES = ('openpyxl', 'xml')
+
+
+def renderizar(motor, casos, url_base):
+    """Se ejecuta en un proceso hijo: genera cada (tipo, tamaño, demo) con `motor` y devuelve los bytes"""
+    os.environ['MOTOR_PLANTILLAS'] = motor
+    os.environ['IMAGEN_CACHE_DIR'] = tempfile.mkdtemp(prefix='comparar_imagenes_')
+    import importlib
+
+    items = comun.items_preoperacional()
+    resultados = []
+    for tipo, tamano, demo in casos:
+        modulo, funcion = GENERADORES[tipo]
+        generar = getattr(importlib.import_module(modulo), funcion)
+        if tipo == 'preoperacional':
+            data = comun.payload_preoperacional(tamano, url_base, None, items)
+        else:
+            data = comun.PAYLOADS[tipo](tamano, url_base, None)
+        resultados.append(generar(data, demo).getvalue())
+    return resultados
+
+
+def _valor(valor):
+    # En el xlsx los números no tienen tipo: 11 y 11.0 son el mismo valor
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    return valor
+
+
+def _estilo(estilo):
+    # Los objetos de estilo de dos libros distintos no se comparan bien entre sí: se compara su XML
+    from openpyxl.xml.functions import tostring
+    return tostring(estilo.to_tree()).decode('utf-8')
+
+
+def _ancla(imagen):
+    desde = imagen.anchor._from
+    return (desde.col, desde.colOff, desde.row, desde.rowOff, imagen.width, imagen.height,
+            hashlib.sha256(imagen._data()).hexdigest()[:12])
+
+
+def contenido_libro(contenido):
+    """{(hoja, sección, clave): valor} con todo lo que se compara del libro"""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(io.BytesIO(contenido))
+    datos = {}
+    for ws in wb.worksheets:
+        for fila in ws.iter_rows():
+            for celda in fila:
+                if celda.value is None and not celda.has_style:
+                    continue
+                datos[(ws.title, 'celda', celda.coordinate)] = (
+                    _valor(celda.value), celda.number_format,
+                    *(_estilo(estilo) for estilo in (celda.font, celda.alignment, celda.border,
+                                                     celda.fill, celda.protection)))
+        datos[(ws.title, 'combinadas', '')] = sorted(str(rango) for rango in ws.merged_cells.ranges)
+        # Las dimensiones sin ancho/alto ni ocultas equivalen a no tenerlas
+        for letra, dimension in ws.column_dimensions.items():
+            if dimension.width or dimension.hidden:
+                datos[(ws.title, 'ancho', letra)] = (dimension.width, dimension.hidden)
+        for numero, dimension in ws.row_dimensions.items():
+            if dimension.height or dimension.hidden:
+                datos[(ws.title, 'alto', numero)] = (dimension.height, dimension.hidden)
+        datos[(ws.title, 'imagenes', '')] = sorted(_ancla(imagen) for imagen in ws._images)
+    return datos
+
+
+def diferencias(a, b):
+    """Claves cuyo contenido cambia entre los dos libros (o que solo están en uno)"""
+    return [clave for clave in sorted(set(a) | set(b), key=str) if a.get(clave) != b.get(clave)]
+
+
+def describir(valor):
+    if isinstance(valor, tuple) and len(valor) == 7:
+        # Celda: los objetos de estilo de openpyxl se resumen
+        valor, formato, *estilos = valor
+        return f"{valor!r} fmt={formato} {' '.join(estilos)}"
+    return repr(valor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tipos', default=','.join(GENERADORES), help='preoperacional,limpieza,salud')
+    parser.add_argument('--tamanos', default=','.join(comun.TAMANOS), help='pequeno,mediano,grande')
+    parser.add_argument('-v', '--detalle', action='store_true', help='muestra todas las diferencias, no solo las primeras')
+    args = parser.parse_args()
+
+    casos = [(tipo, tamano, demo) for tipo in args.tipos.split(',')
+             for tamano in args.tamanos.split(',') for demo in (False, True)]
+    servidor, url_base = comun.iniciar_servidor_imagenes()
+    contexto = multiprocessing.get_context('spawn')
+    try:
+        salidas = {}
+        for motor in MOTORES:
+            with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as proceso:
+                salidas[motor] = proceso.submit(renderizar, motor, casos, url_base).result()
+    finally:
+        servidor.shutdown()
+
+    total = 0
+    for n, (tipo, tamano, demo) in enumerate(casos):
+        base, xml = (contenido_libro(salidas[motor][n]) for motor in MOTORES)
+        distintas = diferencias(base, xml)
+        total += len(distintas)
+        caso = f"{tipo}/{tamano}" + (' demo' if demo else '')
+        print(f"{caso:<28}{'igual' if not distintas else f'{len(distintas)} diferencias'}")
+        for clave in distintas if args.detalle else distintas[:10]:
+            print(f"    {' '.join(map(str, clave)).strip()}: {describir(base.get(clave))} -> {describir(xml.get(clave))}")
+
+    return 1 if total else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""
+Piezas compartidas por los scripts de benchmarks/: servidor local de imágenes con latencia
+configurable, payloads sintéticos de distintos tamaños y cálculo de percentiles.
+"""
+import io
+import math
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+# Fracción de filas de la plantilla y cantidad de días que llena cada tamaño de payload
+TAMANOS = {
+    'pequeno': (0.3, 2),
+    'mediano': (0.6, 4),
+    'grande': (1.0, 7),
+}
+DIAS = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
+
+
+def _imagen(formato, tamano, color):
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', tamano, color).save(buffer, formato)
+    return buffer.getvalue()
+
+
+def iniciar_servidor_imagenes(latencia_ms=0):
+    """
+    Sirve logo y firmas en un puerto libre de 127.0.0.1, esperando `latencia_ms` antes de cada
+    respuesta. Devuelve (servidor, url_base). Cada query string distinta entrega una imagen
+    con otro contenido, así cada iteración puede saltarse la cache de imágenes.
+    """
+    imagenes = {
+        '/logo.png': ('image/png', _imagen('PNG', (800, 400), 'red')),
+        '/firma_1.png': ('image/png', _imagen('PNG', (600, 300), 'blue')),
+        '/firma_2.jpg': ('image/jpeg', _imagen('JPEG', (2400, 1600), 'green')),
+        '/firma_3.png': ('image/png', _imagen('PNG', (600, 300), 'black')),
+    }
+
+    class Manejador(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if latencia_ms:
+                time.sleep(latencia_ms / 1000)
+            ruta, _, variante = self.path.partition('?')
+            imagen = imagenes.get(ruta)
+            if imagen is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            tipo, contenido = imagen
+            # Bytes de más al final (los decodificadores los ignoran): cada variante tiene otro
+            # hash, así tampoco se reutiliza la imagen ya redimensionada
+            contenido += variante.encode('ascii')
+            self.send_response(200)
+            self.send_header('Content-Type', tipo)
+            self.send_header('Content-Length', str(len(contenido)))
+            self.send_header('ETag', f'"{ruta.strip("/")}-{variante}"')
+            self.end_headers()
+            self.wfile.write(contenido)
+
+        def log_message(self, *args):
+            pass
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), Manejador)
+    servidor.daemon_threads = True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_port}"
+
+
+def _urls(url_base, variante):
+    sufijo = f"?v={variante}" if variante is not None else ''
+    return {nombre: f"{url_base}/{nombre}{sufijo}" for nombre in ('logo.png', 'firma_1.png', 'firma_2.jpg', 'firma_3.png')}
+
+
+def items_preoperacional():
+    """Nombres de items de la tabla preoperacional, tomados de la propia plantilla"""
+    from myapp.services.excel_service import TEMPLATE_PATH, indexar_tabla
+    from myapp.services.plantilla_cache import obtener_plantilla_compilada
+    plantilla = obtener_plantilla_compilada(TEMPLATE_PATH)
+    filas_items, _ = plantilla.indice(plantilla.libro.active.title, 'tabla_items', indexar_tabla)
+    return sorted(filas_items, key=filas_items.get)
+
+
+def payload_preoperacional(tamano, url_base, variante=None, items=None):
+    fraccion, n_dias = TAMANOS[tamano]
+    items = items if items is not None else items_preoperacional()
+    urls = _urls(url_base, variante)
+    dias = DIAS[:n_dias]
+    valores = ['good', 'bad', 'na', 'good']
+
+    tabla = {}
+    for i, item in enumerate(items[:max(1, int(len(items) * fraccion))]):
+        # Las secciones solo agrupan: el servicio busca cada item por nombre
+        seccion = tabla.setdefault(f"SECCION {i // 8 + 1}", {})
+        seccion[item.upper()] = {dia: valores[(i + j) % len(valores)] for j, dia in enumerate(dias)}
+
+    return {
+        'FORMULARIO': {
+            'PLACAS No': 'ABC123', 'MODELO': '2020', 'MARCA': 'Chevrolet', 'LUGAR': 'Bogota',
+            'SEMANA DEL': '14/10', 'AL': 'Sin fecha', 'KM TOTAL': 1234,
+            'KMTS INICIAL': '100', 'KMTS FINAL': '1334',
+        },
+        'PIE_TABLA': {
+            'OBSERVACIONES': 'Sin novedades',
+            'MODIFICADO_POR': {dia.capitalize(): f"u{j % 3 + 1}" for j, dia in enumerate(dias)},
+        },
+        'IMAGENES': {
+            'LOGO': urls['logo.png'], 'FIRMA_USER': urls['firma_1.png'],
+            'FIRMA_ENCARGADO': urls['firma_3.png'], 'FIRMA_REP': urls['firma_1.png'],
+            'FIRMAS_RELV': {'FIRMA_USER_u2': urls['firma_2.jpg'], 'FIRMA_USER_u3': urls['firma_3.png']},
+        },
+        **tabla,
+    }
+
+
+def filas_tabla(layout):
+    """(primera, última) fila de la tabla que revisan las firmas por día"""
+    filas = {fila for _, celdas, _ in layout['grupos_firma'] for fila, _ in celdas}
+    return min(filas), max(filas)
+
+
+def payload_limpieza(tamano, url_base, variante=None):
+    from myapp.services.limpieza_service import LAYOUT
+    fraccion, n_dias = TAMANOS[tamano]
+    urls = _urls(url_base, variante)
+    dias = DIAS[:n_dias]
+    inicio, fin = filas_tabla(LAYOUT)
+    return {
+        'FORMULARIO': {'FECHA': '14/10 08:30', 'AÑO': '', 'PLACA': 'ABC123'},
+        'INSPECCION': {
+            f"ELEMENTO {i + 1}": {dia: (i + j) % 3 != 2 for j, dia in enumerate(dias)}
+            for i in range(max(1, int((fin - inicio + 1) * fraccion)))
+        },
+        'IMAGENES': {
+            'LOGO': urls['logo.png'],
+            'MODIFICADO_POR': {dia.capitalize(): f"u{j % 3 + 1}" for j, dia in enumerate(dias)},
+            'FIRMAS_RELV': {'u1': urls['firma_1.png'], 'u2': urls['firma_2.jpg'], 'u3': urls['firma_3.png']},
+        },
+    }
+
+
+def payload_salud(tamano, url_base, variante=None):
+    from myapp.services.salud_service import LAYOUT
+    fraccion, n_dias = TAMANOS[tamano]
+    urls = _urls(url_base, variante)
+    dias = DIAS[:n_dias]
+    inicio, fin = filas_tabla(LAYOUT)
+    return {
+        'FORMULARIO': {
+            'FECHA': '14/10/2026', 'userName': 'Usuario Prueba', 'cc': '123456', 'rol': 'Conductor',
+            'eps': 'EPS', 'arl': 'ARL', 'afp': 'AFP', 'proyecto': 'Proyecto', 'contactoEmergencia': 'Contacto',
+            'telefonoEmergencia': '3000000000', 'parentesco': 'Familiar', 'direccion': 'Calle 1 # 2-3',
+        },
+        'PREGUNTAS': {
+            f"p{i + 1}": {dia: (i + j) % 2 == 0 for j, dia in enumerate(dias)}
+            for i in range(max(1, int((fin - inicio + 1) * fraccion)))
+        },
+        'IMAGENES': {'LOGO': urls['logo.png'], 'FIRMA_USER': urls['firma_1.png']},
+    }
+
+
+PAYLOADS = {
+    'preoperacional': payload_preoperacional,
+    'limpieza': payload_limpieza,
+    'salud': payload_salud,
+}
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre una lista ya ordenada"""
+    if not valores:
+        return float('nan')
+    indice = max(0, min(len(valores) - 1, math.ceil(p / 100 * len(valores)) - 1))
+    return valores[indice]
+
+
+def resumen(valores):
+    ordenados = sorted(valores)
+    return {
+        'n': len(ordenados),
+        'p50': percentil(ordenados, 50),
+        'p90': percentil(ordenados, 90),
+        'p99': percentil(ordenados, 99),
+        'max': ordenados[-1] if ordenados else float('nan'),
+    }
+
+
+def rss_pico_mb():
+    """Pico de memoria residente del proceso en MB"""
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo entrega en KB, macOS en bytes
+    return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
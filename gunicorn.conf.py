@@ -0,0 +1,30 @@
+"""
+Configuración de gunicorn; se carga sola al ejecutarlo desde la raíz del proyecto (gunicorn app:app).
+
+Con preload_app la app se crea y se calienta (myapp/services/calentamiento.py, en when_ready)
+una sola vez en el proceso maestro y los workers la heredan con fork, compartiendo esas páginas
+de memoria en lugar de cargar cada uno plantillas y módulos. Sin precarga cada worker arranca
+sin calentar, salvo con CALENTAR_AL_INICIAR.
+
+Cada worker crea, con el primer lote, su propio pool de BATCH_PROCESOS procesos hijos (cada uno
+con openpyxl y las plantillas cargadas): con N workers son N × BATCH_PROCESOS intérpretes más.
+Por defecto lote_service reparte os.cpu_count() entre WEB_CONCURRENCY (los workers de gunicorn,
+1 si no se define), con un máximo de 2 por worker y sin pool si toca uno solo. En instancias
+chicas conviene BATCH_PROCESOS=0, que genera los lotes dentro del worker.
+"""
+import gc
+import os
+
+# Sin precarga si el calentamiento va en segundo plano: un hilo vivo al hacer fork no pasa a los workers
+preload_app = (os.environ.get('GUNICORN_PRELOAD', '1').lower() in ('1', 'true', 'si')
+               and os.environ.get('CALENTAR_AL_INICIAR', '1').lower() != 'fondo')
+
+
+def when_ready(server):
+    # Corre en el maestro después de cargar la app y antes de crear los workers
+    if preload_app:
+        from myapp.services.calentamiento import calentar
+        calentar()
+        # Los objetos de la precarga quedan fuera del recolector de basura: al recorrerlos
+        # los workers escribirían en esas páginas y dejarían de compartirlas
+        gc.freeze()
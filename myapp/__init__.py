@@ -1,12 +1,37 @@
-from flask import Flask
-from flask_cors import CORS
+from myapp.services.registro import configurar_logging, iniciar_peticion
 
 def create_app():
+    # Flask se importa aquí: los procesos que solo generan reportes (lotes, CLI) no lo cargan
+    from flask import Flask, g, request
+    from flask_cors import CORS
+
     app = Flask(__name__)
+    # Techo global del cuerpo; las rutas de reportes aplican su propio límite (ver excel_routes)
+    from myapp.services.lectura_json import MAX_BYTES_LOTE
+    app.config['MAX_CONTENT_LENGTH'] = MAX_BYTES_LOTE
     CORS(app)
+    configurar_logging()
+
+    # Cada línea de log lleva el id de la petición; se devuelve en X-Request-ID
+    @app.before_request
+    def asignar_id_peticion():
+        g.request_id = iniciar_peticion(request.headers.get('X-Request-ID'))
+
+    @app.after_request
+    def devolver_id_peticion(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
 
     # Registrar Blueprints
     from myapp.routes.excel_routes import excel_blueprint
     app.register_blueprint(excel_blueprint)
+    from myapp.routes.metricas_routes import metricas_blueprint
+    app.register_blueprint(metricas_blueprint)
+
+    # Solo con CALENTAR_AL_INICIAR: por defecto crear la app no carga plantillas ni el stack de
+    # generación (bajo gunicorn con preload_app calienta gunicorn.conf.py)
+    from myapp.services.calentamiento import iniciar_calentamiento
+    iniciar_calentamiento()
 
     return app
@@ -0,0 +1,123 @@
+"""
+Línea de comandos de la aplicación. Cada subcomando importa solo lo que usa: `--help` no carga
+Flask ni el stack de generación (openpyxl, PIL, requests).
+
+    python -m myapp servir --port 8000
+    python -m myapp calentar
+    python -m myapp render reportes.jsonl -o reportes.zip
+    cat salud.jsonl | python -m myapp render --tipo salud -o salida/ --procesos 4
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+from myapp.services.registro import configurar_logging
+
+# Cada cuántos reportes se informa el avance en stderr
+AVANCE_CADA = 1000
+
+
+def servir(args):
+    from myapp import create_app
+    create_app().run(host=args.host, port=args.port)
+
+
+def calentar(args):
+    from myapp.services.calentamiento import calentar as calentar_plantillas
+    inicio = time.perf_counter()
+    calentar_plantillas()
+    print(f"Plantillas y módulos listos en {time.perf_counter() - inicio:.2f} s")
+
+
+def leer_reportes(entrada, args, errores):
+    """
+    Recorre las líneas JSON de `entrada` y entrega (índice, reporte) listos para generar. El
+    índice es el número de línea menos uno (como en /rellenar_excel_lote); las líneas que no son
+    JSON o no forman un reporte válido se anotan en `errores` y se saltan.
+    """
+    from myapp.services.lote_service import validar_reporte
+
+    for numero, linea in enumerate(entrada, 1):
+        if not linea.strip():
+            continue
+        try:
+            reporte = json.loads(linea)
+            # Con --tipo, una línea sin "data" es directamente el payload de la ruta HTTP
+            if args.tipo and isinstance(reporte, dict) and 'data' not in reporte:
+                reporte = {'tipo': args.tipo, 'data': reporte}
+            validar_reporte(numero - 1, reporte)
+        except ValueError as e:
+            errores.append({'indice': numero - 1, 'error': str(e)})
+            continue
+        reporte.setdefault('demo', args.demo)
+        yield numero - 1, reporte
+
+
+def render(args):
+    from myapp.services.lote_service import DirectorioSalida, EscritorLote, generar_en_orden
+
+    if args.entrada == '-':
+        entrada = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+    else:
+        entrada = open(args.entrada, encoding='utf-8')
+    if args.salida.lower().endswith('.zip'):
+        # Los xlsx ya vienen comprimidos: se guardan sin recomprimir
+        destino = zipfile.ZipFile(args.salida, 'w', compression=zipfile.ZIP_STORED)
+    else:
+        destino = DirectorioSalida(args.salida)
+
+    escritor = EscritorLote(destino)
+    inicio = time.perf_counter()
+    with entrada:
+        reportes = leer_reportes(entrada, args, escritor.errores)
+        for n, (i, reporte, (contenido, error)) in enumerate(generar_en_orden(reportes, args.procesos), 1):
+            escritor.agregar(i, reporte, contenido, error)
+            if n % AVANCE_CADA == 0:
+                print(f"{n} reportes ({n / (time.perf_counter() - inicio):.1f}/s)", file=sys.stderr, flush=True)
+    escritor.errores.sort(key=lambda error: error['indice'])
+    escritor.cerrar()
+
+    duracion = time.perf_counter() - inicio
+    print(f"{escritor.generados} reportes generados en {duracion:.1f} s "
+          f"({escritor.generados / duracion if duracion else 0:.1f}/s), {len(escritor.errores)} con error"
+          + (" (ver errores.json)" if escritor.errores else ""), file=sys.stderr)
+    return 1 if escritor.errores else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m myapp', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subcomandos = parser.add_subparsers(dest='comando', required=True)
+
+    servidor = subcomandos.add_parser('servir', help='servidor de desarrollo de Flask (en producción: gunicorn app:app)')
+    servidor.add_argument('--host', default='0.0.0.0')
+    servidor.add_argument('--port', type=int, default=5000)
+    servidor.set_defaults(funcion=servir)
+
+    subcomandos.add_parser(
+        'calentar', help='compila plantillas e índices y genera cada reporte una vez'
+    ).set_defaults(funcion=calentar)
+
+    generador = subcomandos.add_parser(
+        'render', help='genera los reportes de un archivo JSON Lines en paralelo, igual que las rutas HTTP',
+        description='Cada línea es {"tipo": "preoperacional" | "limpieza" | "salud", "data": {...}, '
+                    '"demo": bool opcional, "nombre": opcional}, como los reportes de /rellenar_excel_lote.')
+    generador.add_argument('entrada', nargs='?', default='-', help='archivo .jsonl; "-" o nada para leer stdin')
+    generador.add_argument('-o', '--salida', required=True, help='archivo .zip o carpeta donde dejar los xlsx')
+    generador.add_argument('--tipo', choices=['preoperacional', 'limpieza', 'salud'],
+                           help='tipo para las líneas que traen solo el payload (sin "tipo" ni "data")')
+    generador.add_argument('--demo', action='store_true', help='modo demo para las líneas que no dicen "demo"')
+    generador.add_argument('--procesos', type=int, default=os.cpu_count() or 1,
+                           help='procesos que generan en paralelo; 0 o 1 genera en este proceso (por defecto: núcleos)')
+    generador.set_defaults(funcion=render)
+
+    args = parser.parse_args(argv)
+    configurar_logging()
+    return args.funcion(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
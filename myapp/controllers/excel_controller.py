@@ -1,31 +1,120 @@
+import io
 import os
-from flask import send_file
-from myapp.services.excel_service import procesar_excel
+import tempfile
+from urllib.parse import quote
+from flask import jsonify, send_file, url_for
+from myapp.services.excel_service import procesar_excel, registrar_sin_fila
 from myapp.services.limpieza_service import procesar_excel_dinamico
 from myapp.services.salud_service import procesar_excel_salud
+from myapp.services.metricas import medir
+from myapp.services.imagen_service import registrar_fallidas
+from myapp.services.lectura_json import TIPOS_JSONL, CuerpoDemasiadoGrande, leer_lote
+from myapp.services.lote_service import (TIPOS_REPORTE, guardar_lote, procesar_lote, procesar_lote_consolidado,
+                                         procesar_lote_guardado, validar_lote)
+from myapp.services.resultado_cache import clave_resultado, guardar_resultado, obtener_resultado
+from myapp.services.trabajos_service import ColaLlena, encolar, obtener_estado, ruta_resultado
+from werkzeug.exceptions import RequestEntityTooLarge
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# El ZIP de un lote y los lotes encolados se guardan en memoria hasta este tamaño y después
+# en un archivo temporal
+LOTE_EN_MEMORIA_MB = float(os.environ.get('LOTE_EN_MEMORIA_MB', 32))
+
+
+def es_asincrono(request):
+    """?async=1 encola la generación y responde de inmediato con el id del trabajo"""
+    return request.args.get('async', '').lower() in ('1', 'true', 'si')
+
+
+def encolar_trabajo(generar, archivo, mimetype=XLSX_MIMETYPE):
+    try:
+        trabajo = encolar(generar, archivo, mimetype)
+    except ColaLlena as e:
+        return str(e), 429, {'Retry-After': '5'}
+    respuesta = respuesta_estado(trabajo)
+    respuesta.status_code = 202
+    respuesta.headers['Location'] = url_for('excel.estado_trabajo_route', trabajo_id=trabajo['id'])
+    return respuesta
+
+
+def enviar_xlsx(request, tipo, data, demo, download_name):
+    """
+    Genera el reporte o, si la misma petición ya se generó hace poco, lo sirve de la cache.
+    El hash de la petición va como ETag: mientras siga en la cache, un If-None-Match
+    que coincide responde 304 sin cuerpo. Si alguna imagen no se pudo insertar, el libro
+    se entrega igual pero sin cachear ni ETag (así un reintento lo vuelve a generar) y con
+    el header X-Imagenes-Fallidas. Los items sin fila en la plantilla van en X-Items-Sin-Fila
+    (URL-encoded, separados por coma); ese libro tampoco se cachea, para que cada respuesta
+    lleve el header.
+    """
+    clave = clave_resultado(tipo, data, demo, TIPOS_REPORTE[tipo]['layout'])
+    contenido = obtener_resultado(clave)
+    if contenido is not None and clave in request.if_none_match:
+        # Werkzeug solo evalúa If-None-Match en GET/HEAD; aquí las descargas llegan por POST
+        return '', 304, {'ETag': f'"{clave}"'}
+    fallidas, sin_fila = [], []
+    if contenido is None:
+        with registrar_fallidas() as fallidas, registrar_sin_fila() as sin_fila:
+            excel_buffer = TIPOS_REPORTE[tipo]['generar'](data, demo)
+        if excel_buffer is None:
+            raise RuntimeError("No se pudo generar el archivo.")
+        contenido = excel_buffer.getvalue()
+        if not fallidas and not sin_fila:
+            guardar_resultado(clave, contenido)
+
+    respuesta = send_file(
+        io.BytesIO(contenido),
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=download_name,
+        etag=False if fallidas else clave
+    )
+    if fallidas:
+        respuesta.headers['X-Imagenes-Fallidas'] = str(len(fallidas))
+    if sin_fila:
+        respuesta.headers['X-Items-Sin-Fila'] = ', '.join(quote(item) for item in sin_fila)
+    return respuesta
+
+
+def respuesta_estado(trabajo):
+    return jsonify({
+        'id': trabajo['id'],
+        'estado': trabajo['estado'],
+        'error': trabajo.get('error'),
+        # Terminado, pero sin algunas imágenes que no se pudieron descargar
+        'imagenes_fallidas': trabajo.get('imagenes_fallidas', 0),
+        # Items del payload que no tienen fila en la plantilla ("sección/item")
+        'items_sin_fila': trabajo.get('items_sin_fila', []),
+        'estado_url': url_for('excel.estado_trabajo_route', trabajo_id=trabajo['id']),
+        'resultado_url': url_for('excel.resultado_trabajo_route', trabajo_id=trabajo['id']),
+    })
 
-OUTPUT_PATH = os.path.join(os.getcwd(), 'plantilla_modificada.xlsx')
 
 def rellenar_excel(request, demo: bool = False):
-    data = request.json
+    with medir('json'):
+        data = request.json
+    if not isinstance(data, dict):
+        # Se rechaza antes de cargar la plantilla o encolar nada
+        return "El cuerpo debe ser un objeto JSON.", 400
+    if es_asincrono(request):
+        return encolar_trabajo(lambda: procesar_excel(data, demo), 'plantilla_modificada.xlsx')
     try:
-        procesar_excel(data, demo)
-        return send_file(OUTPUT_PATH, as_attachment=True, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        return enviar_xlsx(request, 'preoperacional', data, demo, 'plantilla_modificada.xlsx')
     except FileNotFoundError:
         return "El archivo de plantilla de Excel no se encontró. Verifique la ruta. controller", 404
     except Exception as e:
         return str(e), 500
     
 def rellenar_excel_limpieza(request, demo: bool = False):
-    data = request.json
+    with medir('json'):
+        data = request.json
+    if not isinstance(data, dict):
+        # Se rechaza antes de cargar la plantilla o encolar nada
+        return "El cuerpo debe ser un objeto JSON.", 400
+    if es_asincrono(request):
+        return encolar_trabajo(lambda: procesar_excel_dinamico(data, demo), 'limpieza.xlsx')
     try:
-        excel_buffer = procesar_excel_dinamico(data, demo)
-        return send_file(
-            excel_buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name='limpieza.xlsx'
-        )
+        return enviar_xlsx(request, 'limpieza', data, demo, 'limpieza.xlsx')
     except FileNotFoundError:
         return "El archivo de plantilla de Excel no se encontró.", 404
     except Exception as e:
@@ -33,16 +122,90 @@ def rellenar_excel_limpieza(request, demo: bool = False):
     
    
 def rellenar_excel_salud(request, demo: bool = False):
-    data = request.json
+    with medir('json'):
+        data = request.json
+    if not isinstance(data, dict):
+        # Se rechaza antes de cargar la plantilla o encolar nada
+        return "El cuerpo debe ser un objeto JSON.", 400
+    if es_asincrono(request):
+        return encolar_trabajo(lambda: procesar_excel_salud(data, demo), 'autoreporte.xlsx')
     try:
-        excel_buffer = procesar_excel_salud(data, demo)
+        return enviar_xlsx(request, 'salud', data, demo, 'autoreporte.xlsx')
+    except FileNotFoundError:
+        return "El archivo de plantilla de Excel no se encontró.", 404
+    except Exception as e:
+        return str(e), 500
+
+
+def archivo_temporal():
+    return tempfile.SpooledTemporaryFile(max_size=int(LOTE_EN_MEMORIA_MB * 1024 * 1024))
+
+
+def rellenar_excel_lote(request):
+    """
+    Acepta la lista de reportes, {"reportes": [...], "consolidado": bool} o JSON Lines (un
+    reporte por línea, Content-Type application/x-ndjson). La lista y JSON Lines se leen del
+    cuerpo a medida que llegan: cada reporte se valida y se genera (o, si es asíncrono, se
+    guarda en un archivo temporal para el trabajo) sin esperar el resto, así la memoria del
+    worker no depende del tamaño del lote. El modo consolidado arma un solo libro con todo y
+    solo llega en la forma de objeto, cuya lista está acotada por MAX_MB_OBJETO.
+    """
+    try:
+        with medir('json'):
+            reportes, consolidado = leer_lote(request.stream, jsonl=request.mimetype in TIPOS_JSONL)
+        if consolidado:
+            # La forma se valida antes de generar o encolar para responder 400 de inmediato
+            validar_lote(reportes)
+            if es_asincrono(request):
+                return encolar_trabajo(lambda: procesar_lote_consolidado(reportes), 'reportes.xlsx')
+            # Un solo libro con una hoja por reporte
+            return send_file(
+                procesar_lote_consolidado(reportes),
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                as_attachment=True,
+                download_name='reportes.xlsx'
+            )
+        if es_asincrono(request):
+            pendientes = guardar_lote(reportes, archivo_temporal())
+            return encolar_trabajo(lambda: procesar_lote_guardado(pendientes), 'reportes.zip', 'application/zip')
         return send_file(
-            excel_buffer,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            procesar_lote(reportes, archivo_temporal()),
+            mimetype='application/zip',
             as_attachment=True,
-            download_name='autoreporte.xlsx'
+            download_name='reportes.zip'
         )
+    except (CuerpoDemasiadoGrande, RequestEntityTooLarge) as e:
+        return getattr(e, 'description', None) or str(e), 413
+    except ValueError as e:
+        return str(e), 400
     except FileNotFoundError:
         return "El archivo de plantilla de Excel no se encontró.", 404
     except Exception as e:
-        return str(e), 500
\ No newline at end of file
+        return str(e), 500
+
+
+def estado_trabajo(trabajo_id):
+    trabajo = obtener_estado(trabajo_id)
+    if trabajo is None:
+        return "El trabajo no existe o ya venció.", 404
+    return respuesta_estado(trabajo)
+
+
+def resultado_trabajo(trabajo_id):
+    trabajo = obtener_estado(trabajo_id)
+    if trabajo is None:
+        return "El trabajo no existe o ya venció.", 404
+    if trabajo['estado'] != 'terminado':
+        # Todavía en cola, procesando o con error: se devuelve el estado
+        respuesta = respuesta_estado(trabajo)
+        respuesta.status_code = 500 if trabajo['estado'] == 'error' else 409
+        return respuesta
+    try:
+        return send_file(
+            ruta_resultado(trabajo_id),
+            mimetype=trabajo['mimetype'],
+            as_attachment=True,
+            download_name=trabajo['archivo']
+        )
+    except FileNotFoundError:
+        return "El resultado del trabajo ya no está disponible.", 404
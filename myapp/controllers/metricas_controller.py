@@ -0,0 +1,36 @@
+import time
+from flask import Response, g, jsonify, request
+from myapp.services import calentamiento
+from myapp.services.metricas import (SERVER_TIMING, exponer, iniciar_medicion, medicion_actual,
+                                     observar, server_timing)
+
+
+def metricas():
+    return Response(exponer(), mimetype='text/plain; version=0.0.4')
+
+
+def healthz():
+    # No toca el stack de generación: responde aunque el calentamiento siga en curso
+    return jsonify({'estado': 'ok', 'calentado': calentamiento.listo.is_set()})
+
+
+def iniciar_peticion():
+    # Las consultas de Prometheus y los health checks no se cuentan en las duraciones de las peticiones
+    if request.endpoint in ('metricas.metricas_route', 'metricas.healthz_route'):
+        return
+    g.inicio_peticion = time.perf_counter()
+    iniciar_medicion()
+
+
+def terminar_peticion(response):
+    inicio = g.get('inicio_peticion')
+    if inicio is None:
+        return response
+
+    listo = time.perf_counter()
+    observar('total', listo - inicio)
+    if SERVER_TIMING:
+        response.headers['Server-Timing'] = server_timing(medicion_actual())
+    # El envío del cuerpo ocurre después de retornar la respuesta: se mide al cerrarla
+    response.call_on_close(lambda: observar('envio', time.perf_counter() - listo))
+    return response
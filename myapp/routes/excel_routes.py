@@ -1,28 +1,65 @@
 from flask import Blueprint, request
-from myapp.controllers.excel_controller import rellenar_excel, rellenar_excel_limpieza, rellenar_excel_salud
+from myapp.services.lectura_json import MAX_BYTES_LOTE, MAX_BYTES_REPORTE, MAX_MB_LOTE, MAX_MB_REPORTE
 
 excel_blueprint = Blueprint('excel', __name__)
 
+
+def controlador():
+    """
+    El controlador trae openpyxl, PIL y requests: se importa con la primera petición que genera
+    un reporte y no al crear la app, así /healthz y el arranque no los esperan.
+    """
+    from myapp.controllers import excel_controller
+    return excel_controller
+
+
+@excel_blueprint.before_request
+def limitar_cuerpo():
+    """
+    Límite del cuerpo según la ruta: MAX_MB_LOTE para /rellenar_excel_lote y MAX_MB_REPORTE para
+    las demás. Un Content-Length mayor se rechaza con 413 sin leer el cuerpo ni importar el
+    controlador; sin Content-Length (chunked) werkzeug corta la lectura al pasar el límite.
+    Asignar request.max_content_length requiere Flask 3.1 (antes era de solo lectura).
+    """
+    lote = request.endpoint == 'excel.rellenar_excel_lote_route'
+    limite = MAX_BYTES_LOTE if lote else MAX_BYTES_REPORTE
+    request.max_content_length = limite
+    if request.content_length is not None and request.content_length > limite:
+        return f"El cuerpo de la petición pasa de {MAX_MB_LOTE if lote else MAX_MB_REPORTE:g} MB.", 413
+
+
 @excel_blueprint.route('/rellenar_excel', methods=['POST'])
 def rellenar_excel_route():
-    return rellenar_excel(request)
+    return controlador().rellenar_excel(request)
 
 @excel_blueprint.route('/rellenar_excel_limpieza', methods=['POST'])
 def rellenar_excel_limpieza_route():
-    return rellenar_excel_limpieza(request)
+    return controlador().rellenar_excel_limpieza(request)
 
 @excel_blueprint.route('/rellenar_excel_salud', methods=['POST'])
 def rellenar_excel_salud_route():
-    return rellenar_excel_salud(request)
+    return controlador().rellenar_excel_salud(request)
 
 @excel_blueprint.route('/rellenar_excel_alt', methods=['POST'])
 def rellenar_excel_alt_route():
-    return rellenar_excel(request, demo=True)
+    return controlador().rellenar_excel(request, demo=True)
 
 @excel_blueprint.route('/rellenar_excel_limpieza_alt', methods=['POST'])
 def rellenar_excel_limpieza_alt_route():
-    return rellenar_excel_limpieza(request, demo=True)
+    return controlador().rellenar_excel_limpieza(request, demo=True)
 
 @excel_blueprint.route('/rellenar_excel_salud_alt', methods=['POST'])
 def rellenar_excel_salud_alt_route():
-    return rellenar_excel_salud(request, demo=True)
+    return controlador().rellenar_excel_salud(request, demo=True)
+
+@excel_blueprint.route('/rellenar_excel_lote', methods=['POST'])
+def rellenar_excel_lote_route():
+    return controlador().rellenar_excel_lote(request)
+
+@excel_blueprint.route('/trabajos/<trabajo_id>', methods=['GET'])
+def estado_trabajo_route(trabajo_id):
+    return controlador().estado_trabajo(trabajo_id)
+
+@excel_blueprint.route('/trabajos/<trabajo_id>/resultado', methods=['GET'])
+def resultado_trabajo_route(trabajo_id):
+    return controlador().resultado_trabajo(trabajo_id)
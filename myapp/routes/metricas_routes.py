@@ -0,0 +1,16 @@
+from flask import Blueprint
+from myapp.controllers.metricas_controller import healthz, metricas, iniciar_peticion, terminar_peticion
+
+metricas_blueprint = Blueprint('metricas', __name__)
+
+# Mide todas las peticiones de la aplicación, no solo las de este blueprint
+metricas_blueprint.before_app_request(iniciar_peticion)
+metricas_blueprint.after_app_request(terminar_peticion)
+
+@metricas_blueprint.route('/metrics', methods=['GET'])
+def metricas_route():
+    return metricas()
+
+@metricas_blueprint.route('/healthz', methods=['GET'])
+def healthz_route():
+    return healthz()
@@ -0,0 +1,71 @@
+import logging
+import os
+import threading
+import time
+
+# Prepara plantillas, índices y módulos al crear la app: '0' (por defecto) no, '1' antes de
+# aceptar peticiones, 'fondo' en un hilo mientras la app ya responde (p. ej. /healthz).
+# Con gunicorn y preload_app calienta gunicorn.conf.py, una vez en el proceso maestro
+CALENTAR_AL_INICIAR = os.environ.get('CALENTAR_AL_INICIAR', '0').lower()
+# URLs de logos (separadas por coma) que se descargan y redimensionan al iniciar, para cada plantilla con LOGO
+CALENTAR_LOGOS = [url.strip() for url in os.environ.get('CALENTAR_LOGOS', '').split(',') if url.strip()]
+
+logger = logging.getLogger(__name__)
+
+# Se marca al terminar el calentamiento; /healthz lo informa
+listo = threading.Event()
+
+
+def iniciar_calentamiento():
+    """Calienta según CALENTAR_AL_INICIAR"""
+    if CALENTAR_AL_INICIAR == 'fondo':
+        threading.Thread(target=calentar, name='calentamiento', daemon=True).start()
+    elif CALENTAR_AL_INICIAR in ('1', 'true', 'si'):
+        calentar()
+
+
+def calentar():
+    """
+    Hace al iniciar el trabajo que si no paga la primera petición de cada worker: compila
+    layouts y plantillas (también las del motor xml), calcula sus índices, genera y guarda
+    cada reporte una vez en vacío y deja en la cache de imágenes los logos de CALENTAR_LOGOS.
+    Con gunicorn --preload ocurre una sola vez en el proceso maestro y los workers lo heredan.
+    Si el proceso ya calentó no repite el trabajo.
+    """
+    if listo.is_set():
+        return
+    # El stack de generación se importa aquí: importar este módulo no lo carga
+    from myapp.services import excel_service, metricas
+    from myapp.services.celdas import construir_indice_fusionadas
+    from myapp.services.imagen_service import obtener_imagen_png
+    from myapp.services.layout_service import cargar_layouts
+    from myapp.services.lote_service import TIPOS_REPORTE
+    from myapp.services.plantilla_cache import cargar_plantilla, indice_plantilla
+
+    inicio = time.perf_counter()
+    # Lo generado al iniciar no cuenta en /metrics
+    with metricas.sin_registrar():
+        layouts = cargar_layouts()
+
+        for tipo, reporte in TIPOS_REPORTE.items():
+            hoja = cargar_plantilla(reporte['plantilla']).active
+            indice_plantilla(hoja, 'fusionadas', construir_indice_fusionadas)
+            if tipo == 'preoperacional':
+                excel_service.precalcular_indices(hoja)
+            try:
+                # Un relleno vacío recorre carga, relleno y guardado con el motor de la plantilla
+                reporte['generar']({}, False)
+            except Exception as e:
+                logger.warning("No se pudo generar el reporte %s al iniciar: %s", tipo, e)
+
+        for url in CALENTAR_LOGOS:
+            for nombre, layout in layouts.items():
+                if 'LOGO' not in layout['imagenes']:
+                    continue
+                try:
+                    obtener_imagen_png(url, layout['imagenes']['LOGO'][1])
+                except Exception as e:
+                    logger.warning("No se pudo precargar el logo %s para %s: %s", url, nombre, e)
+
+    listo.set()
+    logger.info("Calentamiento terminado en %.2f s", time.perf_counter() - inicio)
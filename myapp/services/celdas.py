@@ -0,0 +1,30 @@
+from openpyxl.worksheet.cell_range import CellRange
+from myapp.services.plantilla_cache import indice_plantilla
+
+
+def construir_indice_fusionadas(hoja):
+    """
+    Precalcula (fila, columna) -> rango fusionado para todas las celdas de los rangos
+    fusionados de la hoja. Se arma una vez por plantilla y se reutiliza en cada copia.
+    """
+    indice = {}
+    for merged_range in hoja.merged_cells.ranges:
+        rango = CellRange(merged_range.coord)
+        for fila in range(rango.min_row, rango.max_row + 1):
+            for columna in range(rango.min_col, rango.max_col + 1):
+                indice[(fila, columna)] = rango
+    return indice
+
+
+def obtener_rango_fusionado(hoja, celda):
+    # Verifica si una celda está fusionada y obtiene la celda superior izquierda
+    fusionadas = indice_plantilla(hoja, 'fusionadas', construir_indice_fusionadas)
+    rango = fusionadas.get((celda.row, celda.column))
+    if rango is not None:
+        return rango, hoja.cell(rango.min_row, rango.min_col)
+    return None, celda
+
+
+def obtener_celda_principal(hoja, celda):
+    """Obtiene la celda principal si está en un rango fusionado"""
+    return obtener_rango_fusionado(hoja, celda)[1]
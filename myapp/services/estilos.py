@@ -0,0 +1,43 @@
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Font
+
+# Estilos fijos que usan los servicios: se crean una vez y se aplican por referencia.
+# No son NamedStyle porque esos reemplazan también bordes, relleno y formato de la celda.
+CENTRADO = Alignment(horizontal='center', vertical='center')
+# ✔ / ❌ de las tablas de inspección
+FUENTE_MARCA = Font(name='Segoe UI Symbol', size=22, bold=True)
+FUENTE_ARIAL_12 = Font(name='Arial', size=12, bold=True)
+FUENTE_ARIAL_16 = Font(name='Arial', size=16, bold=True)
+FUENTE_NORMAL = Font(bold=False)
+
+
+def _indice(libro, coleccion, estilo):
+    """Posición de `estilo` en la tabla del libro (_fonts, _alignments), buscada una vez por libro"""
+    indices = getattr(libro, '_indices_estilo', None)
+    if indices is None:
+        indices = libro._indices_estilo = {}
+    registrado = indices.get(id(estilo))
+    if registrado is None or registrado[0] is not estilo:
+        # IndexedList.add calcula el hash del estilo completo: solo la primera vez
+        registrado = indices[id(estilo)] = (estilo, coleccion.add(estilo))
+    return registrado[1]
+
+
+def aplicar_estilo(celda, font=None, alignment=None):
+    """
+    Equivale a celda.font = font y celda.alignment = alignment. En los libros de openpyxl
+    asigna directamente los índices ya conocidos en lugar de buscar el estilo en cada celda.
+    """
+    libro = celda.parent.parent
+    if not isinstance(libro, Workbook):
+        # LibroXML: la celda solo guarda la referencia
+        if font is not None:
+            celda.font = font
+        if alignment is not None:
+            celda.alignment = alignment
+        return
+
+    if font is not None:
+        celda._style.fontId = _indice(libro, libro._fonts, font)
+    if alignment is not None:
+        celda._style.alignmentId = _indice(libro, libro._alignments, alignment)
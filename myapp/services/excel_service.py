@@ -1,63 +1,143 @@
-from io import BytesIO
-from openpyxl import load_workbook
+import contextvars
+import logging
 import openpyxl
-from openpyxl.styles import Font
-from openpyxl.drawing.image import Image as XLImage
-from PIL import Image
 import os
-import requests
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-
-# Construir la ruta relativa desde el directorio actual de ejecución
-TEMPLATE_PATH = os.path.join(os.getcwd(), 'template', 'PREOPERACIONALES.xlsx')
-OUTPUT_PATH = os.path.join(os.getcwd(), 'plantilla_modificada.xlsx')
+from myapp.services.plantilla_cache import cargar_plantilla, indice_plantilla
+from myapp.services.celdas import obtener_rango_fusionado, obtener_celda_principal
+from myapp.services.estilos import FUENTE_ARIAL_12, FUENTE_NORMAL, aplicar_estilo
+from myapp.services.imagen_service import insertar_imagenes_en_celdas
+from myapp.services.layout_service import obtener_layout
+from myapp.services.metricas import medir
+from myapp.services.xlsx_writer import guardar_libro
+
+# Posiciones de la plantilla (template/PREOPERACIONALES.json), compiladas al importar
+LAYOUT = obtener_layout('PREOPERACIONALES')
+TEMPLATE_PATH = LAYOUT['ruta']
+
+logger = logging.getLogger(__name__)
+
+# Items del reporte actual que no tienen fila en la plantilla (ver registrar_sin_fila)
+_sin_fila = contextvars.ContextVar('items_sin_fila', default=None)
+
+
+@contextmanager
+def registrar_sin_fila():
+    """
+    Entrega una lista con los items ("sección/item") que no encontraron fila en la plantilla
+    dentro del bloque. El reporte se genera igual, sin esas marcas; quien llama lo informa.
+    """
+    sin_fila = []
+    token = _sin_fila.set(sin_fila)
+    try:
+        yield sin_fila
+    finally:
+        _sin_fila.reset(token)
 
 
 def procesar_excel(data, demo: bool = False):
     # Verifica que el archivo de plantilla existe
     if not os.path.exists(TEMPLATE_PATH):
-        print(f"ERROR: No se encontró el archivo de plantilla en {TEMPLATE_PATH}")
+        logger.error("No se encontró el archivo de plantilla en %s", TEMPLATE_PATH)
         raise FileNotFoundError("El archivo de plantilla de Excel no se encontró. Verifique la ruta.")
 
     # cargar el archivo de plantilla de Excel
     try:
-        wb = load_workbook(TEMPLATE_PATH)
+        wb = cargar_plantilla(TEMPLATE_PATH, LAYOUT['motor'])
         ws = wb.active
     except Exception as e:
-        print(f"ERROR al cargar el archivo de plantilla: {str(e)}")
+        logger.error("Error al cargar el archivo de plantilla: %s", e)
         raise e
 
+    rellenar_hoja(ws, data, demo)
+
+    # Guardar el archivo modificado en memoria: cada petición tiene su propio buffer
+    return guardar_libro(wb)
+
+
+def rellenar_hoja(ws, data, demo: bool = False):
+    """
+    Llena una hoja con la estructura de la plantilla preoperacional (la hoja de cada vehículo)
+    y devuelve los (sección, item) que no tienen fila en la plantilla
+    """
     # Extraer el objeto FORMULARIO del JSON y eliminarlo del objeto original
     formulario_data = data.pop('FORMULARIO', None)
     pie_tabla = data.pop("PIE_TABLA", None)
     imagenes_data = data.pop("IMAGENES", {})
 
     # Llamar a la función que llena el formulario si existe
-    if formulario_data:
-        rellenar_formulario(ws, formulario_data)
+    with medir('formulario'):
+        if formulario_data:
+            rellenar_formulario(ws, formulario_data)
 
-    if pie_tabla:
-        rellenar_pie_tabla(ws, pie_tabla)
+        if pie_tabla:
+            rellenar_pie_tabla(ws, pie_tabla)
 
     # Llamar a la función que llena la tabla en la sección específica
-    rellenar_tabla(ws, data)
+    with medir('tabla'):
+        sin_fila = rellenar_tabla(ws, data)
     
     if imagenes_data:
         insertar_imagenes(ws, imagenes_data, pie_tabla, demo)
+    return sin_fila
+
+
+# Función para limpiar y normalizar el texto
+def normalizar_texto(texto):
+    if isinstance(texto, str):  # Verifica si es una cadena de texto
+        return texto.strip().lower().rstrip(':')
+    return str(texto)  # Convierte otros tipos de datos a string
+
+
+def indexar_etiquetas(ws):
+    """
+    Recorre la plantilla una sola vez y arma {etiqueta normalizada: (fila, columna)} con la
+    celda donde va el valor: la primera a la derecha de la etiqueta o de su rango fusionado.
+    Si una etiqueta se repite gana la primera, igual que en la búsqueda fila por fila.
+    """
+    etiquetas = {}
+    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
+        for cell in row:
+            if cell.value is None:
+                continue
+            etiqueta = normalizar_texto(cell.value)
+            if etiqueta in etiquetas:
+                continue
 
-    
-
-    # Guardar el archivo modificado
-    wb.save(OUTPUT_PATH)
-
-
-def obtener_rango_fusionado(hoja, celda):
-    # Verifica si una celda está fusionada y obtiene la celda superior izquierda
-    for merged_range in hoja.merged_cells.ranges:
-        if celda.coordinate in merged_range:
-            return merged_range, hoja.cell(merged_range.min_row, merged_range.min_col)
-    return None, celda
-
+            rango_fusionado, _ = obtener_rango_fusionado(ws, cell)
+            if rango_fusionado:
+                # Determinar la celda a la derecha del rango fusionado
+                col_final = rango_fusionado.max_col + 1
+            else:
+                # Si no está fusionada, solo se mueve a la derecha
+                col_final = cell.column + 1
+            etiquetas[etiqueta] = (cell.row, col_final)
+    return etiquetas
+
+
+def ubicar_observaciones(ws):
+    """Devuelve (fila, columna) de la celda debajo de la etiqueta de observaciones, o None"""
+    for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
+        for cell in row:
+            # Normalizar el valor de la celda
+            if cell.value and "observaciones" in str(cell.value).strip().lower():
+                rango_fusionado, _ = obtener_rango_fusionado(ws, cell)
+
+                if rango_fusionado:
+                    # Determinar la celda debajo del rango fusionado
+                    fila_inferior = rango_fusionado.max_row + 1
+                    if fila_inferior <= ws.max_row:
+                        celda_destino = ws.cell(row=fila_inferior, column=cell.column)
+                        celda_principal_destino = obtener_rango_fusionado(ws, celda_destino)[1]
+                        return celda_principal_destino.row, celda_principal_destino.column
+                else:
+                    # Si no está fusionada, simplemente toma la celda de abajo
+                    fila_inferior = cell.row + 1
+                    if fila_inferior <= ws.max_row:
+                        return fila_inferior, cell.column
+                return None
+    return None
 
 
 def rellenar_formulario(ws, data):
@@ -65,12 +145,6 @@ def rellenar_formulario(ws, data):
     fecha_emision = data.pop("Fecha de Emision", None)
     km_total = data.pop("KM TOTAL", None)
 
-    # Función para limpiar y normalizar el texto
-    def normalizar_texto(texto):
-        if isinstance(texto, str):  # Verifica si es una cadena de texto
-            return texto.strip().lower().rstrip(':')
-        return str(texto)  # Convierte otros tipos de datos a string
-
     # Función para actualizar el contenido de la celda sin cambiar la etiqueta y aplicar formato
     def actualizar_celda_con_etiqueta(celda, etiqueta, nuevo_valor):
         contenido_actual = str(celda.value)
@@ -82,28 +156,20 @@ def rellenar_formulario(ws, data):
                 nuevo_contenido = f"{partes[0].strip()}: {nuevo_valor}"
                 celda.value = nuevo_contenido
 
-                # Aplicar negrita a la etiqueta y normal al valor
-                negrita_fuente = Font(bold=True)
-                normal_fuente = Font(bold=False)
-
-                # Aplicar estilos a la etiqueta y al valor
-                celda.font = negrita_fuente  # Aplicar negrita a la celda completa (necesario para inicializar)
-                partes_etiqueta = len(partes[0]) + 1  # Longitud de la etiqueta más ":"
-                for i in range(partes_etiqueta, len(nuevo_contenido)):
-                    celda.font = normal_fuente  # Cambiar el resto a fuente normal
+                # La fuente es de toda la celda: el resultado final es la fuente normal
+                aplicar_estilo(celda, FUENTE_NORMAL)
 
             else:
-                print(f"No se pudo actualizar la celda {celda.coordinate} correctamente.")
+                logger.warning("No se pudo actualizar la celda %s correctamente.", celda.coordinate)
         else:
-            print(f"No se encontró la etiqueta '{etiqueta}' en la celda {celda.coordinate}.")
+            logger.warning("No se encontró la etiqueta '%s' en la celda %s.", etiqueta, celda.coordinate)
     if km_total:
-        # Obtener el rango fusionado y la celda principal para Q8
-        celda_km = ws['Q8']
+        # Obtener el rango fusionado y la celda principal para el kilometraje
+        celda_km = ws[LAYOUT['celdas']['KM_TOTAL']]
         rango_fusionado, celda_principal = obtener_rango_fusionado(ws, celda_km)
         
-        # Aplicar el formato (Arial 14, negrita)
-        fuente = Font(name='Arial', size=12, bold=True)
-        celda_principal.font = fuente
+        # Aplicar el formato (Arial 12, negrita)
+        aplicar_estilo(celda_principal, FUENTE_ARIAL_12)
         
         # Asignar el valor
         celda_principal.value = km_total
@@ -121,73 +187,63 @@ def rellenar_formulario(ws, data):
             # Retornamos en el mismo formato DD/MM
             return fecha_domingo.strftime("%d/%m")
         except Exception as e:
-            print(f"Error procesando la fecha: {e}")
+            logger.warning("Error procesando la fecha: %s", e)
             return None
             
+    # Índice etiqueta normalizada -> celda destino, calculado una sola vez por plantilla
+    etiquetas = indice_plantilla(ws, 'etiquetas_formulario', indexar_etiquetas)
+
     # Iterar sobre los datos del formulario
     for key, value in data.items():
-        # Normalizar la clave del JSON
-        key_normalizado = normalizar_texto(key)
-        found = False
-        # Buscar la celda que coincide con la clave normalizada
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
-            for cell in row:
-                # Normalizar el valor de la celda
-                cell_value_normalizado = normalizar_texto(cell.value)
-                # Si el valor de la celda coincide con la clave del formulario
-                if cell_value_normalizado == key_normalizado:
-                    # Obtener el rango fusionado y la celda principal
-                    rango_fusionado, celda_principal = obtener_rango_fusionado(ws, cell)
-
-                    if rango_fusionado:
-                        # Determinar la celda a la derecha del rango fusionado
-                        col_final = rango_fusionado.max_col + 1
+        destino = etiquetas.get(normalizar_texto(key))
+        if destino is None:
+            logger.warning("No se encontró una celda para la clave '%s'.", key)
+            continue
+
+        # Asignar el valor en la celda después del rango fusionado
+        fila, col_final = destino
+        ws.cell(row=fila, column=col_final).value = value
+
+        # Asignar el domingo calculado a la celda FECHA_DOMINGO del layout
+        if key == "AL":
+            try:                            
+                # Si value es "Sin fecha", usar el valor de "SEMANA DEL"
+                if value == "Sin fecha":
+                    semana_del = data.get("SEMANA DEL")
+                    if semana_del:
+                        value_fecha = calcular_dia_domingo(semana_del)
                     else:
-                        # Si no está fusionada, solo se mueve a la derecha
-                        col_final = cell.column + 1
-
-                    # Asignar el valor en la celda después del rango fusionado
-                    ws.cell(row=cell.row, column=col_final).value = value
-
-                    # Asignar el valor calculado a la celda fusionada F9:G9
-                    if key == "AL":
-                        try:                            
-                            # Si value es "Sin fecha", usar el valor de "SEMANA DEL"
-                            if value == "Sin fecha":
-                                semana_del = data.get("SEMANA DEL")
-                                if semana_del:
-                                    value_fecha = calcular_dia_domingo(semana_del)
-                                else:
-                                    value_fecha = None  # Asignar None si no se encuentra SEMANA DEL
-                            elif not value or (isinstance(value, str) and not value.strip()):
-                                semana_del = data.get("SEMANA DEL")
-                                if semana_del:
-                                    value_fecha = calcular_dia_domingo(semana_del)
-                                else:
-                                    print("No se encontró valor en 'SEMANA DEL' para calcular el domingo")
-                                    value_fecha = None  # Asignar None si no se encuentra SEMANA DEL
-                            else:
-                                value_fecha = calcular_dia_domingo(value)
-                            
-
-                        except Exception as e:
-                            print(f"Error al calcular la fecha del domingo: {e}")
-                            value_fecha = None  # Asignar None en caso de error
-
-                        if value_fecha is not None:
-                            ws['F9'].value = value_fecha  # Asigna el valor a la celda F9
-                            ws['F9'].font = Font(name='Arial', size=12, bold=True)  # Aplicar Arial 12 negrita a la celda F9
-                        else:
-                            print("No se asignó valor a F9 porque value_fecha es None.")
+                        value_fecha = None  # Asignar None si no se encuentra SEMANA DEL
+                elif not value or (isinstance(value, str) and not value.strip()):
+                    semana_del = data.get("SEMANA DEL")
+                    if semana_del:
+                        value_fecha = calcular_dia_domingo(semana_del)
+                    else:
+                        logger.warning("No se encontró valor en 'SEMANA DEL' para calcular el domingo")
+                        value_fecha = None  # Asignar None si no se encuentra SEMANA DEL
+                else:
+                    value_fecha = calcular_dia_domingo(value)
 
-                    found = True
-                    break
-            if found:
-                break
-        if not found:
-            print(f"No se encontró una celda para la clave '{key}'.")
 
-def rellenar_tabla(ws, data):
+            except Exception as e:
+                logger.warning("Error al calcular la fecha del domingo: %s", e)
+                value_fecha = None  # Asignar None en caso de error
+
+            celda_domingo = LAYOUT['celdas']['FECHA_DOMINGO']
+            if value_fecha is not None:
+                ws[celda_domingo].value = value_fecha  # Asigna el valor a la celda del domingo
+                aplicar_estilo(ws[celda_domingo], FUENTE_ARIAL_12)  # Aplicar Arial 12 negrita
+            else:
+                logger.debug("No se asignó valor a %s porque value_fecha es None.", celda_domingo)
+
+DIAS_SEMANA = ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']
+
+
+def indexar_tabla(ws):
+    """
+    Precalcula, una vez por plantilla, {item normalizado: fila} y
+    {día: (columna bien, columna mal)} de la tabla de inspección.
+    """
     # Buscar la celda fusionada que contiene "item"
     fila_items = None
     for merged_range in ws.merged_cells.ranges:
@@ -203,141 +259,90 @@ def rellenar_tabla(ws, data):
     # Determinar dinámicamente las columnas de los días de la semana a partir de la fila "item"
     dias_columna = {}
     for col in range(1, ws.max_column + 1):
-        celda = ws.cell(row=fila_items, column=col)
-        dia = celda.value
-        if dia and dia.strip().lower() in ['lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo']:
-            columna_true = ws.cell(row=fila_items + 1, column=col).column_letter
-            columna_false = ws.cell(row=fila_items + 1, column=col + 1).column_letter
-            dias_columna[dia.strip().capitalize()] = (columna_true, columna_false)
-
-    # Función para verificar si una celda está fusionada
-    def obtener_celda_principal(hoja, celda):
-        for merged_range in hoja.merged_cells.ranges:
-            if celda.coordinate in merged_range:
-                return hoja.cell(merged_range.min_row, merged_range.min_col)
-        return celda
+        dia = ws.cell(row=fila_items, column=col).value
+        if isinstance(dia, str) and dia.strip().lower() in DIAS_SEMANA:
+            dias_columna[dia.strip().capitalize()] = (col, col + 1)
 
+    # Fila de cada item según la columna A; si un nombre se repite gana la primera fila
+    filas_items = {}
+    for row in range(fila_items + 2, ws.max_row + 1):
+        item_excel = ws.cell(row=row, column=1).value
+        if isinstance(item_excel, str):
+            filas_items.setdefault(item_excel.strip().lower(), row)
+
+    return filas_items, dias_columna
+
+
+def precalcular_indices(ws):
+    """Calcula los índices de la plantilla que si no arma la primera petición (ver calentamiento)"""
+    indice_plantilla(ws, 'etiquetas_formulario', indexar_etiquetas)
+    indice_plantilla(ws, 'tabla_items', indexar_tabla)
+    indice_plantilla(ws, 'observaciones', ubicar_observaciones)
+
+
+def rellenar_tabla(ws, data):
+    """Marca la tabla de inspección y devuelve la lista de (sección, item) que no existen en la plantilla"""
+    filas_items, dias_columna = indice_plantilla(ws, 'tabla_items', indexar_tabla)
+
+    def marcar(row, col, valor):
+        obtener_celda_principal(ws, ws.cell(row=row, column=col)).value = valor
+
+    sin_fila = []
     # Iterar sobre las secciones del JSON
     for seccion, items in data.items():
         for item, dias in items.items():
-            # Eliminar espacios en blanco y convertir a minúsculas los nombres de los items del JSON
-            item_stripped_lower = item.strip().lower()
-
             # Encontrar la fila correspondiente al nombre del item
-            for row in range(fila_items + 2, ws.max_row + 1):
-                # Eliminar espacios en blanco y convertir a minúsculas los nombres de los items en la plantilla
-                item_excel = ws[f'A{row}'].value
-                if item_excel and item_excel.strip().lower() == item_stripped_lower:
-                    # Rellenar los días de la semana en sus respectivas columnas
-                    for dia, valor in dias.items():
-                        dia_key = dia.strip().capitalize()
-                        if dia_key in dias_columna:
-                            columna_true, columna_false = dias_columna[dia_key]
-                            if valor == 'good':
-                                celda_destino_true = ws[f"{columna_true}{row}"]
-                                celda_principal_true = obtener_celda_principal(ws, celda_destino_true)
-                                celda_principal_true.value = 'X'
-                            elif valor == 'bad':
-                                celda_destino_false = ws[f"{columna_false}{row}"]
-                                celda_principal_false = obtener_celda_principal(ws, celda_destino_false)
-                                celda_principal_false.value = 'X'
-                            elif valor == 'na':
-                                # Marcar N/A en ambas celdas
-                                celda_destino_true = ws[f"{columna_true}{row}"]
-                                celda_principal_true = obtener_celda_principal(ws, celda_destino_true)
-                                celda_principal_true.value = 'N/A'
-                                
-                                celda_destino_false = ws[f"{columna_false}{row}"]
-                                celda_principal_false = obtener_celda_principal(ws, celda_destino_false)
-                                celda_principal_false.value = 'N/A'
-                            elif valor == 'null':
-                                # No hacer nada, dejar las celdas vacías
-                                pass
-
-                    break
+            row = filas_items.get(item.strip().lower())
+            if row is None:
+                sin_fila.append((seccion, item))
+                continue
+
+            # Rellenar los días de la semana en sus respectivas columnas
+            for dia, valor in dias.items():
+                columnas = dias_columna.get(dia.strip().capitalize())
+                if columnas is None:
+                    continue
+                columna_true, columna_false = columnas
+                if valor == 'good':
+                    marcar(row, columna_true, 'X')
+                elif valor == 'bad':
+                    marcar(row, columna_false, 'X')
+                elif valor == 'na':
+                    # Marcar N/A en ambas celdas
+                    marcar(row, columna_true, 'N/A')
+                    marcar(row, columna_false, 'N/A')
+                # 'null': no hacer nada, dejar las celdas vacías
+
+    if sin_fila:
+        nombres = [f'{seccion}/{item}' for seccion, item in sin_fila]
+        logger.warning("Items sin fila en la plantilla: %s", ', '.join(nombres))
+        registrados = _sin_fila.get()
+        if registrados is not None:
+            registrados.extend(nombres)
+    return sin_fila
 
 
 def rellenar_pie_tabla(ws, data):
     observaciones = data.pop("OBSERVACIONES", None)
     # Llenar las observaciones en la celda debajo de la identificada
     if observaciones:
-        found = False
-        for row in ws.iter_rows(min_row=1, max_row=ws.max_row, min_col=1, max_col=ws.max_column):
-            for cell in row:
-                # Normalizar el valor de la celda
-                if cell.value and "observaciones" in str(cell.value).strip().lower():
-                    # Obtener el rango fusionado y la celda principal
-                    rango_fusionado, celda_principal = obtener_rango_fusionado(ws, cell)
-
-                    if rango_fusionado:
-                        # Determinar la celda debajo del rango fusionado
-                        fila_inferior = rango_fusionado.max_row + 1
-
-                        if fila_inferior <= ws.max_row:
-                            celda_destino = ws.cell(row=fila_inferior, column=cell.column)
-                            celda_principal_destino = obtener_rango_fusionado(ws, celda_destino)[1]
-                            celda_principal_destino.value = observaciones
-
-                    else:
-                        # Si no está fusionada, simplemente toma la celda de abajo
-                        fila_inferior = cell.row + 1
-                        if fila_inferior <= ws.max_row:
-                            ws.cell(row=fila_inferior, column=cell.column).value = observaciones
-
-                    found = True
-                    break
-            if found:
-                break
-        if not found:
-            print("No se encontró una celda para 'OBSERVACIONES'.")
+        destino = indice_plantilla(ws, 'observaciones', ubicar_observaciones)
+        if destino:
+            fila, columna = destino
+            ws.cell(row=fila, column=columna).value = observaciones
+        else:
+            logger.warning("No se encontró una celda para 'OBSERVACIONES'.")
 
 def insertar_imagenes(ws, imagenes_data, pie_tabla, demo: bool = False):
-    celdas_imagenes = {
-        'LOGO': 'A1',
-        'FIRMA_USER': 'B84',
-        'FIRMA_ENCARGADO': 'M84'
-    }
-
-    # Definir tamaños fijos para cada tipo de imagen (ancho, alto) en píxeles
-    tamanos_fijos = {
-        'FIRMA_REP': (110, 80),
-        'LOGO': (200, 100), 
-        'FIRMA_USER': (150, 75),  
-        'FIRMA_ENCARGADO': (180, 105)
-    }
-
-    # Mapeo de columnas a días
-    columnas_dias = {
-        'H': 'Lunes',
-        'J': 'Martes',
-        'L': 'Miercoles',
-        'N': 'Jueves',
-        'P': 'Viernes',
-        'R': 'Sabado',
-        'T': 'Domingo'
-    }
-
-    # Grupos de celdas para verificar y celdas donde insertar firma
-    grupos_celdas_firma_rep = [
-        (['H14', 'H15', 'H16', 'H17', 'H18', 'H19', 'H21', 'H22', 'H23', 'H24', 'H52', 'H53', 'H54', 
-          'I14', 'I15', 'I16', 'I17', 'I18', 'I19', 'I21', 'I22', 'I23', 'I24', 'I52', 'I53', 'I54'], 'H77'),
-        (['J14', 'J15', 'J16', 'J17', 'J18', 'J19', 'J21', 'J22', 'J23', 'J24', 'J52', 'J53', 'J54', 
-          'K14', 'K15', 'K16', 'K17', 'K18', 'K19', 'K21', 'K22', 'K23', 'K24', 'K52', 'K53', 'K54'], 'J77'),
-        (['L14', 'L15', 'L16', 'L17', 'L18', 'L19', 'L21', 'L22', 'L23', 'L24', 'L52', 'L53', 'L54', 
-          'M14', 'M15', 'M16', 'M17', 'M18', 'M19', 'M21', 'M22', 'M23', 'M24', 'M52', 'M53', 'M54'], 'L77'),
-        (['N14', 'N15', 'N16', 'N17', 'N18', 'N19', 'N21', 'N22', 'N23', 'N24', 'N52', 'N53', 'N54', 
-          'O14', 'O15', 'O16', 'O17', 'O18', 'O19', 'O21', 'O22', 'O23', 'O24', 'O52', 'O53', 'O54'], 'N77'),
-        (['P14', 'P15', 'P16', 'P17', 'P18', 'P19', 'P21', 'P22', 'P23', 'P24', 'P52', 'P53', 'P54', 
-          'Q14', 'Q15', 'Q16', 'Q17', 'Q18', 'Q19', 'Q21', 'Q22', 'Q23', 'Q24', 'Q52', 'Q53', 'Q54'], 'P77'),
-        (['R14', 'R15', 'R16', 'R17', 'R18', 'R19', 'R21', 'R22', 'R23', 'R24', 'R52', 'R53', 'R54', 
-          'S14', 'S15', 'S16', 'S17', 'S18', 'S19', 'S21', 'S22', 'S23', 'S24', 'S52', 'S53', 'S54'], 'R77'),
-        (['T14', 'T15', 'T16', 'T17', 'T18', 'T19', 'T21', 'T22', 'T23', 'T24', 'T52', 'T53', 'T54', 
-          'U14', 'U15', 'U16', 'U17', 'U18', 'U19', 'U21', 'U22', 'U23', 'U24', 'U52', 'U53', 'U54'], 'T77')
-    ]
+    # Celdas y tamaños fijos (ancho, alto) en píxeles de cada tipo de imagen
+    celdas_imagenes = LAYOUT['imagenes']
 
     # Obtener el diccionario modifiedBy del PIE_TABLA
     modified_by = pie_tabla.get('MODIFICADO_POR', {})
 
+    # Primero se recolectan todas las imágenes a insertar para descargarlas en paralelo
+    colocaciones = []
+
     for tipo_imagen, url in imagenes_data.items():
         if url:
             # Si es el LOGO y estamos en modo demo, lo saltamos
@@ -345,15 +350,12 @@ def insertar_imagenes(ws, imagenes_data, pie_tabla, demo: bool = False):
                 continue
                 
             if tipo_imagen in celdas_imagenes:
-                celda = celdas_imagenes[tipo_imagen]
-                insertar_imagen_en_celda(ws, url, celda, tamanos_fijos[tipo_imagen])
+                celda, tamano = celdas_imagenes[tipo_imagen]
+                colocaciones.append((url, celda, tamano))
             elif tipo_imagen == 'FIRMA_REP' or tipo_imagen.startswith('FIRMA_USER_'):
-                for celdas_verificar, celda_firma in grupos_celdas_firma_rep:
-                    if any(ws[celda].value for celda in celdas_verificar):
-                        # Obtener el día correspondiente a este grupo de celdas
-                        columna_dia = celda_firma[0]  
-                        dia = columnas_dias.get(columna_dia)
-                        
+                # Por cada día: celdas a verificar y celda donde insertar la firma
+                for dia, celdas_verificar, celda_firma in LAYOUT['grupos_firma']:
+                    if any(ws.cell(row=fila, column=col).value for fila, col in celdas_verificar):
                         # Obtener el UID del usuario que modificó ese día
                         uid_modificador = modified_by.get(dia)
                         
@@ -370,36 +372,12 @@ def insertar_imagenes(ws, imagenes_data, pie_tabla, demo: bool = False):
                             firma_a_usar = imagenes_data['FIRMA_USER']
 
                         if firma_a_usar:
-                            print(f"Insertando firma en celda {celda_firma}")
-                            insertar_imagen_en_celda(ws, firma_a_usar, celda_firma, tamanos_fijos['FIRMA_REP'])
-                            print(f"✅ Firma insertada exitosamente en {celda_firma}")
+                            logger.debug("Insertando firma en celda %s", celda_firma)
+                            colocaciones.append((firma_a_usar, celda_firma, LAYOUT['tamano_firma']))
                         else:
-                            print(f"❌ Error: No se encontró firma para insertar en {celda_firma}")
+                            logger.warning("No se encontró firma para insertar en %s", celda_firma)
                     else:
-                        print(f"No se insertó firma en {celda_firma} porque no se encontró contenido en el grupo")
-
-def insertar_imagen_en_celda(ws, url, celda, tamano):
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        img_data = BytesIO(response.content)
-        
-        width_px, height_px = tamano
-        
-        pil_image = Image.open(img_data)
-        pil_image = pil_image.resize((width_px, height_px), Image.LANCZOS)
-        
-        img_final = BytesIO()
-        pil_image.save(img_final, format='PNG')
-        img_final.seek(0)
-        
-        img = XLImage(img_final)
-        img.width = width_px
-        img.height = height_px
-        
-        ws.add_image(img, celda)
-        print(f"Imagen insertada correctamente en la celda {celda}")
-    except Exception as e:
-        print(f"Error al insertar la imagen en la celda {celda}: {e}")
+                        logger.debug("No se insertó firma en %s porque no se encontró contenido en el grupo", celda_firma)
 
-# ... (resto del código sin cambios)
\ No newline at end of file
+    # Descargar todas las imágenes a la vez y luego insertarlas en el mismo orden
+    insertar_imagenes_en_celdas(ws, colocaciones)
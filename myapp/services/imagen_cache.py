@@ -0,0 +1,145 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMemoria:
+    """LRU en memoria acotado por bytes totales."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._datos = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, clave):
+        with self._lock:
+            valor = self._datos.get(clave)
+            if valor is not None:
+                self._datos.move_to_end(clave)
+            return valor
+
+    def guardar(self, clave, valor):
+        if len(valor) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._datos.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._datos[clave] = valor
+            self._bytes += len(valor)
+            # Expulsar las entradas menos usadas hasta volver al límite
+            while self._bytes > self.max_bytes:
+                _, expulsado = self._datos.popitem(last=False)
+                self._bytes -= len(expulsado)
+
+
+class CacheDisco:
+    """
+    LRU en disco acotado por bytes totales. Un archivo por clave; la fecha de
+    modificación hace de marca de último uso, así varios workers comparten el directorio.
+    """
+
+    # Cada cuántas escrituras se revisa el tamaño total del directorio
+    REVISAR_CADA = 50
+
+    def __init__(self, directorio, max_bytes, extension='.png'):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.extension = extension
+        self._escrituras = 0
+        self._lock = threading.Lock()
+        # El directorio se crea con la primera escritura: importar el módulo no toca el disco.
+        # None = todavía no se intentó; False = no se pudo crear y se usa solo la memoria
+        self._disponible = None
+
+    def _preparar(self):
+        if self._disponible is None:
+            try:
+                os.makedirs(self.directorio, exist_ok=True)
+                self._disponible = True
+            except OSError as e:
+                logger.warning("No se pudo crear la cache de disco en %s, se usa solo memoria: %s",
+                               self.directorio, e)
+                self._disponible = False
+        return self._disponible
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, hashlib.sha256(clave.encode('utf-8')).hexdigest() + self.extension)
+
+    def obtener(self, clave):
+        if self._disponible is False:
+            return None
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, 'rb') as archivo:
+                valor = archivo.read()
+            os.utime(ruta)  # Marcar como usado recientemente
+            return valor
+        except OSError:
+            return None
+
+    def guardar(self, clave, valor):
+        if not self._preparar():
+            return
+        ruta = self._ruta(clave)
+        try:
+            # Escritura atómica para que otro worker nunca lea un archivo a medias
+            fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as archivo:
+                archivo.write(valor)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logger.warning("No se pudo guardar en la cache de disco: %s", e)
+            return
+
+        with self._lock:
+            self._escrituras += 1
+            revisar = self._escrituras % self.REVISAR_CADA == 0
+        if revisar:
+            self.recortar()
+
+    def recortar(self):
+        """Borra los archivos usados hace más tiempo hasta quedar bajo el límite"""
+        archivos = []
+        total = 0
+        for entrada in os.scandir(self.directorio):
+            if entrada.name.endswith(self.extension):
+                info = entrada.stat()
+                archivos.append((info.st_mtime, info.st_size, entrada.path))
+                total += info.st_size
+        archivos.sort()
+        for _, tamano, ruta in archivos:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(ruta)
+                total -= tamano
+            except OSError:
+                pass
+
+
+class CacheDosNiveles:
+    """Cache de dos niveles: memoria y, opcionalmente, disco (imágenes procesadas, xlsx generados)."""
+
+    def __init__(self, memoria, disco=None):
+        self.memoria = memoria
+        self.disco = disco
+
+    def obtener(self, clave):
+        valor = self.memoria.obtener(clave)
+        if valor is None and self.disco is not None:
+            valor = self.disco.obtener(clave)
+            if valor is not None:
+                self.memoria.guardar(clave, valor)
+        return valor
+
+    def guardar(self, clave, valor):
+        self.memoria.guardar(clave, valor)
+        if self.disco is not None:
+            self.disco.guardar(clave, valor)
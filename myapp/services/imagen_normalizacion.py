@@ -0,0 +1,93 @@
+import logging
+import os
+from io import BytesIO
+from PIL import Image, ImageOps
+
+# Límites de las imágenes recibidas: se revisan antes de decodificar
+IMAGEN_MAX_BYTES = int(float(os.environ.get('IMAGEN_MAX_MB', 10)) * 1024 * 1024)
+IMAGEN_MAX_PIXELES = int(float(os.environ.get('IMAGEN_MAX_MEGAPIXELES', 40)) * 1_000_000)
+# Si ya redimensionada tiene a lo sumo estos colores (firmas, logos planos) se guarda como PNG de
+# paleta con exactamente esos colores; con más se deja en color verdadero (nunca se reducen colores)
+COLORES_PALETA = 256
+
+# Subirla cuando cambian los bytes que produce normalizar_a_png: forma parte de la clave de la cache
+VERSION = 3
+
+# Orientaciones EXIF que intercambian ancho y alto
+_ORIENTACIONES_ROTADAS = (5, 6, 7, 8)
+
+logger = logging.getLogger(__name__)
+
+
+class ImagenInvalida(ValueError):
+    """La imagen no se puede usar: formato no reconocido o tamaño por encima de los límites."""
+
+
+def validar_bytes(tamano_bytes):
+    if tamano_bytes > IMAGEN_MAX_BYTES:
+        raise ImagenInvalida(f"La imagen pesa {tamano_bytes} bytes; el máximo es {IMAGEN_MAX_BYTES}.")
+
+
+def abrir_imagen(contenido, tamano):
+    """
+    Abre la imagen sin decodificarla todavía y valida sus límites. Los JPEG se preparan con
+    draft para que el decodificador entregue directamente una versión reducida (1/2, 1/4 u 1/8)
+    que siga siendo al menos del tamaño final.
+    """
+    validar_bytes(len(contenido))
+    try:
+        imagen = Image.open(BytesIO(contenido))
+    except (Image.UnidentifiedImageError, Image.DecompressionBombError) as e:
+        raise ImagenInvalida(f"Imagen no válida: {e}") from e
+
+    if imagen.format in ('JPEG', 'MPO'):
+        ancho, alto = tamano
+        if imagen.getexif().get(0x0112) in _ORIENTACIONES_ROTADAS:
+            ancho, alto = alto, ancho
+        imagen.draft('RGB', (ancho, alto))
+
+    if imagen.width * imagen.height > IMAGEN_MAX_PIXELES:
+        raise ImagenInvalida(
+            f"La imagen tiene {imagen.width}x{imagen.height} píxeles; el máximo es {IMAGEN_MAX_PIXELES}.")
+    return imagen
+
+
+def normalizar_a_png(contenido, tamano):
+    """
+    Convierte la imagen recibida en el PNG que va en la celda: orientada según su EXIF,
+    redimensionada a `tamano`, sin metadatos y, si tiene pocos colores, con paleta (sin perder color).
+    """
+    imagen = abrir_imagen(contenido, tamano)
+    logger.debug("Normalizando imagen %s %sx%s a %sx%s", imagen.format, imagen.width, imagen.height, *tamano)
+
+    imagen = ImageOps.exif_transpose(imagen)
+    transparente = imagen.mode in ('RGBA', 'LA', 'PA') or 'transparency' in imagen.info
+    modo = 'RGBA' if transparente else 'RGB'
+    if imagen.mode != modo:
+        imagen = imagen.convert(modo)
+
+    # reducing_gap: primero reduce por un factor entero (barato) y termina con LANCZOS
+    imagen = imagen.resize(tamano, Image.LANCZOS, reducing_gap=3.0)
+
+    imagen = a_paleta(imagen) or imagen
+
+    # Sin EXIF, perfil ICC ni textos de la imagen original
+    imagen.info = {}
+    salida = BytesIO()
+    imagen.save(salida, format='PNG')
+    return salida.getvalue()
+
+
+def a_paleta(imagen):
+    """
+    La misma imagen (RGB o RGBA) como paleta si tiene a lo sumo COLORES_PALETA colores; None si
+    tiene más. Cada píxel se asigna a su color exacto: quantize de Pillow aproxima los colores.
+    """
+    colores = imagen.getcolors(COLORES_PALETA)
+    if colores is None:
+        return None
+    indices = {color: i for i, (_, color) in enumerate(colores)}
+    paletizada = Image.new('P', imagen.size)
+    paletizada.putdata([indices[pixel] for pixel in imagen.getdata()])
+    paletizada.putpalette([canal for _, color in colores for canal in color], rawmode=imagen.mode)
+    return paletizada
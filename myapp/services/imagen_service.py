@@ -0,0 +1,211 @@
+import contextvars
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from myapp.services.metricas import medir
+from myapp.services.imagen_cache import CacheDisco, CacheDosNiveles, CacheMemoria
+from myapp.services.imagen_normalizacion import VERSION, normalizar_a_png, validar_bytes
+from myapp.services.xlsx_writer import ImagenCompartida, media_del_libro
+
+# Máximo de descargas simultáneas por worker, compartido entre todas las peticiones
+MAX_DESCARGAS = int(os.environ.get('MAX_DESCARGAS_IMAGENES', 8))
+# (conexión, lectura) en segundos para cada descarga
+TIMEOUT_DESCARGA = (3.05, 10)
+# Segundos para una descarga completa: el timeout de lectura vale para cada lectura, así que sin
+# este límite un servidor que manda de a pocos bytes retendría el hilo (y la petición)
+TIEMPO_MAX_DESCARGA = float(os.environ.get('TIEMPO_MAX_DESCARGA', 15))
+
+# Segundos durante los que se confía en una URL ya descargada sin volver a preguntar al servidor
+IMAGEN_CACHE_TTL = int(os.environ.get('IMAGEN_CACHE_TTL', 300))
+IMAGEN_CACHE_MAX_MB = int(os.environ.get('IMAGEN_CACHE_MAX_MB', 64))
+IMAGEN_CACHE_DISCO_MAX_MB = int(os.environ.get('IMAGEN_CACHE_DISCO_MAX_MB', 256))
+# Directorio del nivel en disco; vacío para desactivarlo
+IMAGEN_CACHE_DIR = os.environ.get(
+    'IMAGEN_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'llenar_formulario_imagenes'))
+MAX_URLS_RECORDADAS = 4096
+
+logger = logging.getLogger(__name__)
+
+# Celdas cuya imagen no se pudo insertar en el reporte actual (ver registrar_fallidas)
+_fallidas = contextvars.ContextVar('imagenes_fallidas', default=None)
+
+
+@contextmanager
+def registrar_fallidas():
+    """
+    Entrega una lista con las celdas cuya imagen falló dentro del bloque (en este hilo o
+    contexto). Un reporte con imágenes faltantes se entrega igual, pero no debe cachearse.
+    """
+    fallidas = []
+    token = _fallidas.set(fallidas)
+    try:
+        yield fallidas
+    finally:
+        _fallidas.reset(token)
+
+
+def _nueva_sesion():
+    sesion = requests.Session()
+    adapter = HTTPAdapter(pool_connections=MAX_DESCARGAS, pool_maxsize=MAX_DESCARGAS)
+    sesion.mount('http://', adapter)
+    sesion.mount('https://', adapter)
+    return sesion
+
+
+_session = _nueva_sesion()
+_executor = ThreadPoolExecutor(max_workers=MAX_DESCARGAS, thread_name_prefix='descarga-imagen')
+
+
+def _reiniciar_tras_fork():
+    """
+    En un worker creado con fork (gunicorn --preload) las conexiones abiertas del maestro
+    y los hilos del pool no sirven: cada proceso arma su propia sesión y su propio pool.
+    """
+    global _session, _executor
+    _session = _nueva_sesion()
+    _executor = ThreadPoolExecutor(max_workers=MAX_DESCARGAS, thread_name_prefix='descarga-imagen')
+
+
+# register_at_fork solo existe en POSIX; en Windows no hay fork
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_tras_fork)
+
+# Imágenes finales (PNG ya redimensionado) por (hash del contenido original, tamaño)
+_cache = CacheDosNiveles(
+    CacheMemoria(IMAGEN_CACHE_MAX_MB * 1024 * 1024),
+    CacheDisco(IMAGEN_CACHE_DIR, IMAGEN_CACHE_DISCO_MAX_MB * 1024 * 1024) if IMAGEN_CACHE_DIR else None
+)
+
+# url -> (hash del contenido, etag, momento de la última validación)
+_urls = OrderedDict()
+_urls_lock = threading.Lock()
+
+
+def _recordar_url(url, huella, etag):
+    with _urls_lock:
+        _urls[url] = (huella, etag, time.monotonic())
+        _urls.move_to_end(url)
+        while len(_urls) > MAX_URLS_RECORDADAS:
+            _urls.popitem(last=False)
+
+
+def _clave(huella, tamano):
+    return f"{huella}:{tamano[0]}x{tamano[1]}:v{VERSION}"
+
+
+def descargar_imagen(url, headers=None):
+    """
+    Descarga una imagen usando la sesión compartida (conexiones keep-alive) y devuelve
+    (response, contenido). Deja de leer si la imagen pasa de IMAGEN_MAX_BYTES o si la descarga
+    lleva más de TIEMPO_MAX_DESCARGA (a lo sumo se pasa en una lectura, TIMEOUT_DESCARGA[1]).
+    """
+    limite = time.monotonic() + TIEMPO_MAX_DESCARGA
+    with medir('descarga'):
+        with _session.get(url, timeout=TIMEOUT_DESCARGA, headers=headers, stream=True) as response:
+            declarado = response.headers.get('Content-Length', '')
+            if declarado.isdigit():
+                validar_bytes(int(declarado))
+            partes = []
+            leidos = 0
+            # read1 entrega lo que trae cada lectura del socket; iter_content espera a juntar el
+            # bloque completo y con un goteo lento el límite no se revisaría nunca
+            for parte in iter(lambda: response.raw.read1(64 * 1024, decode_content=True), b''):
+                if time.monotonic() > limite:
+                    raise requests.Timeout(f"La descarga de {url} pasó de {TIEMPO_MAX_DESCARGA:g} s.")
+                leidos += len(parte)
+                validar_bytes(leidos)
+                partes.append(parte)
+            return response, b''.join(partes)
+
+
+def obtener_imagen_png(url, tamano):
+    """
+    Devuelve los bytes PNG de la imagen en `url` redimensionada a `tamano`, usando la cache.
+    Pasado el TTL, la URL se revalida con If-None-Match si el servidor entregó un ETag.
+    """
+    with _urls_lock:
+        conocida = _urls.get(url)
+
+    headers = None
+    if conocida is not None:
+        huella, etag, validada = conocida
+        if time.monotonic() - validada < IMAGEN_CACHE_TTL:
+            png = _cache.obtener(_clave(huella, tamano))
+            if png is not None:
+                return png
+        elif etag:
+            headers = {'If-None-Match': etag}
+
+    response, contenido = descargar_imagen(url, headers)
+    if response.status_code == 304:
+        png = _cache.obtener(_clave(huella, tamano))
+        if png is not None:
+            _recordar_url(url, huella, etag)
+            return png
+        # La versión procesada ya fue expulsada: descargar de nuevo completa
+        response, contenido = descargar_imagen(url)
+
+    response.raise_for_status()
+    huella = hashlib.sha256(contenido).hexdigest()
+    _recordar_url(url, huella, response.headers.get('ETag'))
+
+    clave = _clave(huella, tamano)
+    png = _cache.obtener(clave)
+    if png is None:
+        with medir('redimension'):
+            png = normalizar_a_png(contenido, tamano)
+        _cache.guardar(clave, png)
+    return png
+
+
+def descargar_imagenes(colocaciones):
+    """
+    Lanza en paralelo la obtención de todas las imágenes (url, tamaño) sin repetir
+    y devuelve {(url, tamaño): Future}. Future.result() entrega los bytes PNG o relanza el error.
+    """
+    descargas = {}
+    for url, tamano in colocaciones:
+        if url and (url, tamano) not in descargas:
+            # Copia del contexto: las etapas medidas en el hilo cuentan para la petición
+            contexto = contextvars.copy_context()
+            descargas[(url, tamano)] = _executor.submit(contexto.run, obtener_imagen_png, url, tamano)
+    return descargas
+
+
+def insertar_imagen_en_celda(ws, url, descarga, celda, tamano):
+    """
+    Inserta una imagen ya procesada (Future de descargar_imagenes) en una celda específica.
+    La misma imagen puesta en varias celdas u hojas del libro se guarda una sola vez.
+    Devuelve False si la imagen no se pudo insertar.
+    """
+    try:
+        media = media_del_libro(ws.parent, descarga.result())
+        ws.add_image(ImagenCompartida(media, *tamano), celda)
+        logger.debug("Imagen insertada correctamente en la celda %s", celda)
+        return True
+    except Exception as e:
+        # Continuar sin la imagen en caso de error
+        logger.warning("Error al insertar la imagen en la celda %s: %s", celda, e)
+        fallidas = _fallidas.get()
+        if fallidas is not None:
+            fallidas.append(celda)
+        return False
+
+
+def insertar_imagenes_en_celdas(ws, colocaciones):
+    """
+    Inserta una lista de (url, celda, tamaño): primero lanza todas las descargas en paralelo
+    y luego agrega las imágenes a la hoja en el mismo orden de la lista. Devuelve cuántas fallaron.
+    """
+    with medir('imagenes'):
+        descargas = descargar_imagenes((url, tamano) for url, _, tamano in colocaciones)
+        return sum(not insertar_imagen_en_celda(ws, url, descargas[(url, tamano)], celda, tamano)
+                   for url, celda, tamano in colocaciones)
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+# Las plantillas xlsx y sus especificaciones de posiciones (<NOMBRE>.json) viven juntas
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'template')
+# Motor de relleno para todas las plantillas ('openpyxl' o 'xml'); vacío para usar el "motor" de cada JSON.
+# Las plantillas usan openpyxl; antes de pasar una a xml, benchmarks/comparar_motores.py debe dar igual
+MOTOR_PLANTILLAS = os.environ.get('MOTOR_PLANTILLAS', '')
+
+_layouts = {}
+_lock = threading.Lock()
+
+
+def compilar_layout(spec):
+    """
+    Convierte la especificación JSON de una plantilla en las tablas que usan los servicios:
+    coordenadas ya resueltas, tamaños como tuplas y, por cada día, las celdas a revisar
+    y la celda donde va la firma.
+    """
+    layout = {
+        'ruta': os.path.join(TEMPLATE_DIR, spec['archivo']),
+        # openpyxl: modelo completo del libro; xml: solo reescribe las partes modificadas del xlsx
+        'motor': MOTOR_PLANTILLAS or spec.get('motor', 'openpyxl'),
+        # Para rangos fusionados ("D5:I5") se escribe en la celda superior izquierda
+        'formulario': {campo: celda.split(':')[0] for campo, celda in spec.get('formulario', {}).items()},
+        'celdas': dict(spec.get('celdas', {})),
+        'imagenes': {
+            tipo: (imagen['celda'], tuple(imagen['tamano']))
+            for tipo, imagen in spec.get('imagenes', {}).items()
+        },
+        'dias_columnas': {dia: tuple(columnas) for dia, columnas in spec.get('dias', {}).items()},
+        'fila_inicial': spec.get('tabla', {}).get('fila_inicial'),
+        'grupos_firma': [],
+        'tamano_firma': None,
+    }
+
+    firmas_dia = spec.get('firmas_dia')
+    if firmas_dia:
+        layout['tamano_firma'] = tuple(firmas_dia['tamano'])
+        filas = [fila for inicio, fin in firmas_dia['filas_verificar'] for fila in range(inicio, fin + 1)]
+        for dia, (col_inicio, col_fin) in layout['dias_columnas'].items():
+            indice_inicio = column_index_from_string(col_inicio)
+            indice_fin = column_index_from_string(col_fin)
+            celdas_verificar = [
+                (fila, col) for col in range(indice_inicio, indice_fin + 1) for fila in filas
+            ]
+            # La firma va en la columna del medio del día
+            col_media = get_column_letter((indice_inicio + indice_fin) // 2)
+            layout['grupos_firma'].append((dia.capitalize(), celdas_verificar, f"{col_media}{firmas_dia['fila']}"))
+
+    return layout
+
+
+def obtener_layout(nombre):
+    """Carga y compila (una sola vez por proceso) la especificación template/<nombre>.json"""
+    layout = _layouts.get(nombre)
+    if layout is None:
+        with _lock:
+            layout = _layouts.get(nombre)
+            if layout is None:
+                with open(os.path.join(TEMPLATE_DIR, f"{nombre}.json"), encoding='utf-8') as archivo:
+                    layout = compilar_layout(json.load(archivo))
+                _layouts[nombre] = layout
+    return layout
+
+
+def cargar_layouts():
+    """Compila todas las especificaciones de la carpeta de plantillas"""
+    return {
+        nombre[:-len('.json')]: obtener_layout(nombre[:-len('.json')])
+        for nombre in sorted(os.listdir(TEMPLATE_DIR)) if nombre.endswith('.json')
+    }
@@ -0,0 +1,248 @@
+import io
+import json
+import os
+import re
+
+# Tamaño máximo del cuerpo de las peticiones: rutas de un reporte y ruta de lotes
+MAX_MB_REPORTE = float(os.environ.get('MAX_MB_REPORTE', 2))
+MAX_MB_LOTE = float(os.environ.get('MAX_MB_LOTE', 256))
+MAX_BYTES_REPORTE = int(MAX_MB_REPORTE * 1024 * 1024)
+MAX_BYTES_LOTE = int(MAX_MB_LOTE * 1024 * 1024)
+# Lista de "reportes" que hay que leer completa (forma {"reportes": [...], "consolidado": ...}):
+# los lotes más grandes van como lista o JSON Lines, que se leen a medida que llegan
+MAX_MB_OBJETO = float(os.environ.get('MAX_MB_OBJETO', 16))
+MAX_BYTES_OBJETO = int(MAX_MB_OBJETO * 1024 * 1024)
+
+TAMANO_BLOQUE = 64 * 1024
+# Content-Type de los lotes en JSON Lines (un reporte por línea)
+TIPOS_JSONL = ('application/x-ndjson', 'application/jsonl', 'application/jsonlines', 'application/x-jsonlines')
+_BLANCOS = b' \t\r\n'
+# Para buscar el final de un valor: contenido de un string (hasta la comilla de cierre), texto y
+# strings completos hasta el próximo corchete, y el separador que termina un escalar
+_CUERPO_STRING = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*', re.DOTALL)
+_HASTA_CORCHETE = re.compile(rb'[^"\[\]{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*', re.DOTALL)
+_FIN_ESCALAR = re.compile(rb'[\s,\]}:]')
+# Ningún reporte se acerca a este anidamiento; más hondo, json.loads llega al límite de recursión
+_MAX_PROFUNDIDAD = 100
+
+
+class CuerpoDemasiadoGrande(ValueError):
+    """Un valor del cuerpo pasa de su límite (se responde 413)."""
+
+
+class LectorJSON:
+    """
+    Lee valores JSON de un flujo binario UTF-8 por bloques: solo guarda en memoria el valor
+    que está decodificando, no el cuerpo completo. Cada valor se recorre una sola vez para
+    encontrar dónde termina y se decodifica una sola vez, ya completo.
+    """
+
+    def __init__(self, flujo, max_bytes_valor=MAX_BYTES_REPORTE,
+                 mensaje_grande=f"Un reporte del lote pasa de {MAX_MB_REPORTE:g} MB."):
+        self.flujo = flujo
+        self.max_bytes_valor = max_bytes_valor
+        self.mensaje_grande = mensaje_grande
+        self._datos = bytearray()
+        self._pos = 0
+        self._fin = False
+
+    def _leer(self):
+        """Agrega un bloque a los bytes pendientes (descartando lo ya consumido); False si no queda más"""
+        if self._fin:
+            return False
+        bloque = self.flujo.read(TAMANO_BLOQUE)
+        self._fin = not bloque
+        del self._datos[:self._pos]
+        self._datos += bloque
+        self._pos = 0
+        return not self._fin
+
+    def siguiente(self):
+        """Próximo carácter que no es espacio, sin consumirlo; '' al final del cuerpo"""
+        while True:
+            while self._pos < len(self._datos) and self._datos[self._pos] in _BLANCOS:
+                self._pos += 1
+            if self._pos < len(self._datos):
+                return chr(self._datos[self._pos])
+            if not self._leer():
+                return ''
+
+    def consumir(self, caracter):
+        if self.siguiente() != caracter:
+            raise ValueError(f"JSON inválido: se esperaba '{caracter}'.")
+        self._pos += 1
+
+    def valor(self):
+        """Decodifica el próximo valor JSON completo, leyendo más bloques mientras esté cortado"""
+        primero = self.siguiente()
+        if not primero:
+            raise ValueError("JSON inválido: el cuerpo terminó antes de tiempo.")
+        # Estado del recorrido, relativo al inicio del valor (self._pos se mueve al leer)
+        desde, profundidad, en_string = 1, 0, primero == '"'
+        if primero in '[{':
+            profundidad = 1
+        elif not en_string:
+            desde = 0
+        while True:
+            fin, desde, profundidad, en_string = self._recorrer(desde, profundidad, en_string)
+            if fin is not None:
+                break
+            if self._fin:
+                # Cortado al final del cuerpo: la decodificación da el error (400)
+                fin = len(self._datos)
+                break
+            if len(self._datos) - self._pos > self.max_bytes_valor:
+                raise CuerpoDemasiadoGrande(self.mensaje_grande)
+            self._leer()
+        texto = self._datos[self._pos:fin]
+        self._pos = fin
+        try:
+            return json.loads(texto.decode('utf-8'))
+        except UnicodeDecodeError as e:
+            raise ValueError(f"El cuerpo no es UTF-8 válido: {e}") from e
+        except json.JSONDecodeError as e:
+            raise ValueError(f"JSON inválido: {e}") from e
+
+    def _recorrer(self, desde, profundidad, en_string):
+        """
+        Busca el final del valor que empieza en self._pos, siguiendo strings, escapes y
+        corchetes. Devuelve (fin, ...) con fin absoluto, o (None, estado) para seguir
+        después de leer otro bloque.
+        """
+        datos, base = self._datos, self._pos
+        i = base + desde
+        while True:
+            if en_string:
+                # El regex salta el contenido y los escapes completos: se detiene en la comilla de
+                # cierre, al final de los datos o en un '\\' cuyo carácter llega en otro bloque
+                i = _CUERPO_STRING.match(datos, i).end()
+                if i == len(datos) or datos[i] != ord('"'):
+                    return None, i - base, profundidad, True
+                i, en_string = i + 1, False
+                if not profundidad:
+                    return i, 0, 0, False
+            elif profundidad:
+                # Texto y strings completos se saltan en el regex: aquí solo se ven corchetes
+                # y la comilla de un string que sigue en el próximo bloque
+                i = _HASTA_CORCHETE.match(datos, i).end()
+                if i == len(datos):
+                    return None, i - base, profundidad, False
+                caracter = datos[i]
+                i += 1
+                if caracter == ord('"'):
+                    en_string = True
+                elif caracter in b'[{':
+                    profundidad += 1
+                    if profundidad > _MAX_PROFUNDIDAD:
+                        raise ValueError(f"JSON inválido: más de {_MAX_PROFUNDIDAD} niveles de anidamiento.")
+                else:
+                    profundidad -= 1
+                    if not profundidad:
+                        return i, 0, 0, False
+            else:
+                # Número, true, false o null: termina en el primer separador
+                m = _FIN_ESCALAR.search(datos, i)
+                if not m:
+                    return None, len(datos) - base, 0, False
+                return m.start(), 0, 0, False
+
+    def terminar(self):
+        if self.siguiente():
+            raise ValueError("JSON inválido: hay datos después del final.")
+
+
+def elementos_arreglo(lector):
+    """Entrega uno por uno los elementos del arreglo JSON que sigue en `lector`, a medida que llegan"""
+    lector.consumir('[')
+    if lector.siguiente() == ']':
+        lector.consumir(']')
+        return
+    while True:
+        yield lector.valor()
+        if lector.siguiente() == ']':
+            lector.consumir(']')
+            return
+        lector.consumir(',')
+
+
+def claves_objeto(lector):
+    """
+    Recorre el objeto JSON que sigue en `lector` y entrega cada clave dejando el lector en su
+    valor, que debe consumir quien itera (lector.valor() o elementos_arreglo).
+    """
+    lector.consumir('{')
+    if lector.siguiente() == '}':
+        lector.consumir('}')
+        return
+    while True:
+        if lector.siguiente() != '"':
+            raise ValueError("JSON inválido: se esperaba una clave entre comillas.")
+        clave = lector.valor()
+        lector.consumir(':')
+        yield clave
+        if lector.siguiente() == '}':
+            lector.consumir('}')
+            return
+        lector.consumir(',')
+
+
+def leer_lote(flujo, jsonl=False):
+    """
+    Lee el cuerpo de /rellenar_excel_lote y devuelve (reportes, consolidado). Si el cuerpo es un
+    arreglo o JSON Lines, `reportes` es un iterador que entrega cada reporte apenas llega. En la
+    forma {"reportes": [...], "consolidado": bool} la lista también se entrega a medida que
+    llega si "consolidado": false viene antes; si no, el modo se conoce recién al final y la
+    lista se lee completa, hasta MAX_MB_OBJETO.
+    """
+    if jsonl:
+        return _lineas_jsonl(flujo), False
+
+    lector = LectorJSON(flujo)
+    inicio = lector.siguiente()
+    if inicio == '[':
+        def reportes():
+            yield from elementos_arreglo(lector)
+            lector.terminar()
+        return reportes(), False
+    if inicio != '{':
+        raise ValueError("El lote debe ser una lista no vacía de reportes.")
+
+    claves = claves_objeto(lector)
+    reportes, consolidado = None, None
+    for clave in claves:
+        if clave == 'reportes' and consolidado is False and lector.siguiente() == '[':
+            return _resto_del_objeto(lector, claves), False
+        if clave == 'reportes':
+            lector.max_bytes_valor, lector.mensaje_grande = MAX_BYTES_OBJETO, (
+                f"La lista de reportes pasa de {MAX_MB_OBJETO:g} MB: envíe la lista sola, JSON Lines "
+                f"o \"consolidado\": false antes de \"reportes\".")
+            reportes = lector.valor()
+            lector.max_bytes_valor = MAX_BYTES_REPORTE
+        elif clave == 'consolidado':
+            consolidado = bool(lector.valor())
+        else:
+            lector.valor()
+    lector.terminar()
+    return reportes, bool(consolidado)
+
+
+def _resto_del_objeto(lector, claves):
+    yield from elementos_arreglo(lector)
+    # Lo que sigue a la lista ya no cambia el modo: solo se valida que el JSON esté completo
+    for _ in claves:
+        lector.valor()
+    lector.terminar()
+
+
+def _lineas_jsonl(flujo):
+    if isinstance(flujo, io.RawIOBase):
+        # El LimitedStream de werkzeug hace readline() byte a byte: se lee con buffer
+        flujo = io.BufferedReader(flujo, TAMANO_BLOQUE)
+    for numero, linea in enumerate(iter(lambda: flujo.readline(MAX_BYTES_REPORTE + 1), b''), 1):
+        if len(linea) > MAX_BYTES_REPORTE:
+            raise CuerpoDemasiadoGrande(f"La línea {numero} pasa de {MAX_MB_REPORTE:g} MB.")
+        if linea.strip():
+            try:
+                yield json.loads(linea)
+            except ValueError as e:
+                raise ValueError(f"Línea {numero}: JSON inválido: {e}") from e
@@ -0,0 +1,341 @@
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from collections import deque
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from myapp.services import excel_service, limpieza_service, salud_service
+from myapp.services.excel_service import registrar_sin_fila
+from myapp.services.imagen_service import registrar_fallidas
+from myapp.services.lectura_json import leer_lote
+from myapp.services.registro import configurar_logging
+from myapp.services.plantilla_cache import cargar_plantilla, clonar_hoja
+from myapp.services.xlsx_writer import guardar_libro
+
+# tipo de reporte -> función que genera el xlsx, función que llena una hoja, layout, plantilla y nombre base
+TIPOS_REPORTE = {
+    'preoperacional': {
+        'generar': excel_service.procesar_excel,
+        'rellenar_hoja': excel_service.rellenar_hoja,
+        'layout': excel_service.LAYOUT,
+        'plantilla': excel_service.LAYOUT['ruta'],
+        'archivo': 'preoperacional',
+    },
+    'limpieza': {
+        'generar': limpieza_service.procesar_excel_dinamico,
+        'rellenar_hoja': limpieza_service.rellenar_hoja,
+        'layout': limpieza_service.LAYOUT,
+        'plantilla': limpieza_service.LAYOUT['ruta'],
+        'archivo': 'limpieza',
+    },
+    'salud': {
+        'generar': salud_service.procesar_excel_salud,
+        'rellenar_hoja': salud_service.rellenar_hoja,
+        'layout': salud_service.LAYOUT,
+        'plantilla': salud_service.LAYOUT['ruta'],
+        'archivo': 'autoreporte',
+    },
+}
+
+# Procesos para generar lotes; 0 genera todo en el mismo proceso de la petición. Cada worker
+# de gunicorn tiene su propio pool, así que por defecto se reparten los núcleos entre los
+# WEB_CONCURRENCY workers, como mucho 2 por worker; si toca uno solo se genera en el worker.
+BATCH_PROCESOS_MAX = 2
+_procesos_por_worker = min(BATCH_PROCESOS_MAX,
+                           (os.cpu_count() or 1) // max(1, int(os.environ.get('WEB_CONCURRENCY', 1))))
+BATCH_PROCESOS = int(os.environ.get('BATCH_PROCESOS', _procesos_por_worker if _procesos_por_worker > 1 else 0))
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obtener_pool():
+    """Pool de procesos compartido por todos los lotes del worker, así cada proceso hijo
+    conserva sus plantillas e imágenes cacheadas entre un lote y otro."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: los hijos no heredan hilos ni conexiones abiertas del worker
+            _pool = ProcessPoolExecutor(max_workers=BATCH_PROCESOS,
+                                        mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=configurar_logging)
+        return _pool
+
+
+def validar_lote(reportes):
+    """Valida la forma del lote antes de generar nada; lanza ValueError con el motivo"""
+    if not isinstance(reportes, list) or not reportes:
+        raise ValueError("El lote debe ser una lista no vacía de reportes.")
+    for i, reporte in enumerate(reportes):
+        validar_reporte(i, reporte)
+
+
+def validar_reporte(i, reporte):
+    """Valida un reporte del lote ({"tipo", "data", ...}); lanza ValueError con el motivo"""
+    if not isinstance(reporte, dict) or not isinstance(reporte.get('data'), dict):
+        raise ValueError(f"Reporte {i}: se esperaba un objeto con 'tipo' y 'data'.")
+    if reporte.get('tipo') not in TIPOS_REPORTE:
+        raise ValueError(f"Reporte {i}: tipo '{reporte.get('tipo')}' no válido. "
+                         f"Use uno de: {', '.join(TIPOS_REPORTE)}.")
+
+
+def generar_reporte(tipo, data, demo: bool = False):
+    """Genera un reporte y devuelve los bytes del xlsx. Se ejecuta dentro del pool de procesos."""
+    excel_buffer = TIPOS_REPORTE[tipo]['generar'](data, demo)
+    if excel_buffer is None:
+        raise RuntimeError("No se pudo generar el reporte.")
+    return excel_buffer.getvalue()
+
+
+def _generar_seguro(reporte):
+    """
+    (bytes, None) si salió bien, (None, error) si falló y (bytes, aviso) si se generó pero
+    faltan imágenes que no se pudieron insertar o items sin fila en la plantilla
+    """
+    try:
+        with registrar_fallidas() as fallidas, registrar_sin_fila() as sin_fila:
+            contenido = generar_reporte(reporte['tipo'], reporte['data'], reporte.get('demo', False))
+    except Exception as e:
+        return None, str(e)
+    return contenido, _aviso_incompleto(fallidas, sin_fila)
+
+
+def _aviso_incompleto(fallidas, sin_fila):
+    """Texto para errores.json (o la hoja Errores) de un reporte generado a medias; None si está completo"""
+    faltantes = []
+    if fallidas:
+        faltantes.append(f"no se pudieron insertar las imágenes de {', '.join(fallidas)}")
+    if sin_fila:
+        faltantes.append(f"items sin fila en la plantilla: {', '.join(sin_fila)}")
+    return f"Reporte incompleto: {'; '.join(faltantes)}." if faltantes else None
+
+
+def nombre_archivo(i, reporte):
+    """Nombre del archivo dentro del ZIP: el 'nombre' enviado (saneado) o uno numerado por tipo"""
+    nombre = reporte.get('nombre')
+    if nombre:
+        nombre = re.sub(r'[^\w.\- ]', '_', os.path.basename(str(nombre))).strip() or None
+    if not nombre:
+        nombre = f"{i + 1:03d}_{TIPOS_REPORTE[reporte['tipo']]['archivo']}"
+    if not nombre.lower().endswith('.xlsx'):
+        nombre += '.xlsx'
+    return nombre
+
+
+def _en_ventana(enviar, entradas, en_vuelo):
+    """
+    Envía cada (índice, reporte) con `enviar` (que devuelve un futuro) dejando a lo sumo
+    `en_vuelo` pendientes, y entrega (índice, reporte, resultado) en el orden de entrada.
+    """
+    pendientes = deque()
+    for i, reporte in entradas:
+        pendientes.append((i, reporte, enviar(reporte)))
+        if len(pendientes) >= en_vuelo:
+            i_listo, reporte_listo, futuro = pendientes.popleft()
+            yield i_listo, reporte_listo, futuro.result()
+    while pendientes:
+        i_listo, reporte_listo, futuro = pendientes.popleft()
+        yield i_listo, reporte_listo, futuro.result()
+
+
+def generar_en_orden(entradas, procesos, en_vuelo=None):
+    """
+    Genera los reportes de un iterable de (índice, reporte) que puede ser muy largo (p. ej. un
+    archivo JSONL) y entrega (índice, reporte, (bytes, error)) en el mismo orden. Usa un pool
+    propio de `procesos` procesos con a lo sumo `en_vuelo` reportes pendientes, así la memoria
+    no crece con el tamaño de la entrada. Con 0 o 1 genera en este mismo proceso: un solo
+    proceso hijo no agrega paralelismo y sí el costo de enviarle cada reporte.
+    """
+    if procesos <= 1:
+        for i, reporte in entradas:
+            yield i, reporte, _generar_seguro(reporte)
+        return
+
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=configurar_logging) as pool:
+        yield from _en_ventana(lambda reporte: pool.submit(_generar_seguro, reporte),
+                               entradas, en_vuelo or procesos * 4)
+
+
+class DirectorioSalida:
+    """Destino de un lote en una carpeta, con la misma interfaz que usa EscritorLote de un ZipFile"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        os.makedirs(ruta, exist_ok=True)
+
+    def writestr(self, nombre, datos):
+        if isinstance(datos, str):
+            datos = datos.encode('utf-8')
+        with open(os.path.join(self.ruta, nombre), 'wb') as archivo:
+            archivo.write(datos)
+
+    def close(self):
+        pass
+
+
+class EscritorLote:
+    """
+    Escribe los xlsx de un lote en un ZipFile o DirectorioSalida con nombres sin repetir y,
+    al cerrar, errores.json con los reportes que fallaron o quedaron incompletos ("parcial").
+    """
+
+    def __init__(self, destino):
+        self.destino = destino
+        self.errores = []
+        self.generados = 0
+        self._usados = set()
+
+    def agregar(self, i, reporte, contenido, error):
+        nombre = nombre_archivo(i, reporte)
+        if nombre in self._usados:
+            nombre = f"{i + 1:03d}_{nombre}"
+        self._usados.add(nombre)
+
+        if error is not None and contenido is None:
+            logger.error("Error generando el reporte %s (%s): %s", i, reporte['tipo'], error)
+            self.errores.append({'indice': i, 'tipo': reporte['tipo'], 'archivo': nombre, 'error': error})
+            return
+        if error is not None:
+            # Generado, pero incompleto: se incluye y queda anotado
+            logger.warning("Reporte %s (%s) incompleto: %s", i, reporte['tipo'], error)
+            self.errores.append({'indice': i, 'tipo': reporte['tipo'], 'archivo': nombre, 'error': error,
+                                 'parcial': True})
+        self.destino.writestr(nombre, contenido)
+        self.generados += 1
+
+    def cerrar(self):
+        if self.errores:
+            self.destino.writestr('errores.json', json.dumps(self.errores, ensure_ascii=False, indent=2))
+        self.destino.close()
+
+
+def _validados(reportes):
+    for i, reporte in enumerate(reportes):
+        validar_reporte(i, reporte)
+        yield i, reporte
+
+
+def procesar_lote(reportes, destino=None):
+    """
+    Genera los reportes del lote y los devuelve empaquetados en un ZIP (por defecto un BytesIO;
+    `destino` puede ser cualquier archivo binario con seek, p. ej. un SpooledTemporaryFile).
+    Cada reporte es {"tipo": "preoperacional" | "limpieza" | "salud", "data": {...},
+    "demo": bool opcional, "nombre": opcional}. Los que fallan se listan en errores.json.
+    `reportes` puede ser un iterador (el cuerpo de la petición a medida que llega): cada reporte
+    se valida y se envía a generar apenas se lee, con una ventana acotada de pendientes.
+    """
+    if not isinstance(reportes, Iterator):
+        # Con la lista completa se valida todo antes de generar nada
+        validar_lote(reportes)
+        en_paralelo = BATCH_PROCESOS > 0 and len(reportes) > 1
+    else:
+        en_paralelo = BATCH_PROCESOS > 0
+
+    if en_paralelo:
+        pool = _obtener_pool()
+        resultados = _en_ventana(lambda reporte: pool.submit(_generar_seguro, reporte),
+                                 _validados(reportes), BATCH_PROCESOS * 4)
+    else:
+        resultados = ((i, reporte, _generar_seguro(reporte)) for i, reporte in _validados(reportes))
+
+    zip_buffer = destino if destino is not None else io.BytesIO()
+    # Los xlsx ya vienen comprimidos: se guardan sin recomprimir
+    archivo_zip = zipfile.ZipFile(zip_buffer, 'w', compression=zipfile.ZIP_STORED)
+    escritor = EscritorLote(archivo_zip)
+    try:
+        for i, reporte, (contenido, error) in resultados:
+            escritor.agregar(i, reporte, contenido, error)
+        if not escritor.generados and not escritor.errores:
+            raise ValueError("El lote debe ser una lista no vacía de reportes.")
+    except BaseException:
+        # El ZIP a medias se cierra ahora: si lo cierra el recolector, el destino puede estar cerrado
+        archivo_zip.close()
+        raise
+    escritor.cerrar()
+
+    zip_buffer.seek(0)
+    return zip_buffer
+
+
+def guardar_lote(reportes, destino):
+    """
+    Valida los reportes a medida que llegan y los escribe como JSON Lines en `destino` (p. ej.
+    un SpooledTemporaryFile), para encolar un lote sin tenerlo entero en memoria. Lanza
+    ValueError si el lote está vacío o algún reporte no es válido.
+    """
+    cantidad = 0
+    for _, reporte in _validados(reportes):
+        destino.write(json.dumps(reporte, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n')
+        cantidad += 1
+    if not cantidad:
+        raise ValueError("El lote debe ser una lista no vacía de reportes.")
+    destino.seek(0)
+    return destino
+
+
+def procesar_lote_guardado(archivo):
+    """procesar_lote sobre un lote escrito por guardar_lote, leído línea por línea; cierra el archivo"""
+    with archivo:
+        reportes, _ = leer_lote(archivo, jsonl=True)
+        return procesar_lote(reportes)
+
+
+def titulo_hoja(i, reporte, usados):
+    """Título de hoja válido para Excel (máx. 31 caracteres, sin []:*?/\\) y sin repetir"""
+    titulo = nombre_archivo(i, reporte)[:-len('.xlsx')]
+    titulo = re.sub(r'[\[\]:*?/\\]', '_', titulo)[:31]
+    if titulo.lower() in usados:
+        titulo = f"{i + 1:03d}_{titulo}"[:31]
+    usados.add(titulo.lower())
+    return titulo
+
+
+def procesar_lote_consolidado(reportes):
+    """
+    Genera un solo libro con una hoja por reporte (vehículo o persona), todas clonadas de la
+    plantilla cacheada. Las imágenes repetidas (logo, firmas) se guardan una vez y se
+    referencian desde cada hoja. Todos los reportes deben ser del mismo tipo.
+    """
+    validar_lote(reportes)
+    tipos = {reporte['tipo'] for reporte in reportes}
+    if len(tipos) > 1:
+        raise ValueError("El modo consolidado requiere que todos los reportes sean del mismo tipo.")
+    tipo = TIPOS_REPORTE[tipos.pop()]
+
+    wb = cargar_plantilla(tipo['plantilla'])
+    base = wb.active
+    # Todas las hojas se clonan de la plantilla antes de rellenar ninguna
+    hojas = [base] + [clonar_hoja(base) for _ in reportes[1:]]
+
+    errores = []
+    usados = set()
+    for i, (ws, reporte) in enumerate(zip(hojas, reportes)):
+        ws.title = titulo_hoja(i, reporte, usados)
+        try:
+            with registrar_fallidas() as fallidas, registrar_sin_fila() as sin_fila:
+                tipo['rellenar_hoja'](ws, reporte['data'], reporte.get('demo', False))
+        except Exception as e:
+            logger.error("Error generando la hoja %s: %s", ws.title, e)
+            errores.append((i, ws.title, str(e)))
+            wb.remove(ws)
+            continue
+        aviso = _aviso_incompleto(fallidas, sin_fila)
+        if aviso:
+            # La hoja queda, pero en la hoja Errores se indica que está incompleta
+            errores.append((i, ws.title, aviso))
+
+    if errores:
+        hoja_errores = wb.create_sheet('Errores')
+        hoja_errores.append(['Índice', 'Hoja', 'Error'])
+        for error in errores:
+            hoja_errores.append(list(error))
+
+    return guardar_libro(wb)
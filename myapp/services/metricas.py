@@ -0,0 +1,131 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Límites (segundos) de los buckets de los histogramas
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Agrega el header Server-Timing con las etapas de cada petición
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'si')
+
+NOMBRE_METRICA = 'llenar_formulario_etapa_segundos'
+
+# etapa -> [conteo por bucket (+Inf al final), suma, total]. Cada worker tiene los suyos.
+_histogramas = {}
+_lock = threading.Lock()
+
+# Etapas medidas durante la petición actual: {etapa: segundos}
+_medicion = contextvars.ContextVar('medicion', default=None)
+# En True (p. ej. durante el calentamiento) las duraciones no se registran
+_sin_registro = contextvars.ContextVar('sin_registro', default=False)
+# Solo en benchmarks (iniciar_medicion(memoria=True) con tracemalloc activo): {etapa: bytes de
+# pico por encima de lo asignado al empezar la etapa}
+_memoria = contextvars.ContextVar('memoria', default=None)
+# Etapas con memoria medida en curso en el proceso: [asignado al empezar, pico visto]. tracemalloc
+# tiene un solo pico por proceso: al cerrar una etapa se pasa a las que siguen abiertas antes de
+# reiniciarlo, así una etapa anidada no borra el pico de la que la contiene.
+_etapas_memoria = []
+_lock_memoria = threading.Lock()
+
+
+def observar(etapa, segundos):
+    """Registra una duración en el histograma de la etapa y en la medición de la petición"""
+    if _sin_registro.get():
+        return
+    indice = bisect.bisect_left(BUCKETS, segundos)
+    with _lock:
+        histograma = _histogramas.get(etapa)
+        if histograma is None:
+            histograma = _histogramas[etapa] = [[0] * (len(BUCKETS) + 1), 0.0, 0]
+        histograma[0][indice] += 1
+        histograma[1] += segundos
+        histograma[2] += 1
+
+        medicion = _medicion.get()
+        if medicion is not None:
+            medicion[etapa] = medicion.get(etapa, 0.0) + segundos
+
+
+@contextmanager
+def medir(etapa):
+    """with medir('plantilla'): ... registra cuánto tardó el bloque, aunque lance una excepción"""
+    memoria = _memoria.get()
+    if memoria is None or not tracemalloc.is_tracing():
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            observar(etapa, time.perf_counter() - inicio)
+        return
+
+    with _lock_memoria:
+        medida = [tracemalloc.get_traced_memory()[0], 0]
+        _etapas_memoria.append(medida)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observar(etapa, time.perf_counter() - inicio)
+        with _lock_memoria:
+            pico = tracemalloc.get_traced_memory()[1]
+            for abierta in _etapas_memoria:
+                abierta[1] = max(abierta[1], pico)
+            tracemalloc.reset_peak()
+            _etapas_memoria.remove(medida)
+        memoria[etapa] = max(memoria.get(etapa, 0), medida[1] - medida[0])
+
+
+@contextmanager
+def sin_registrar():
+    """Lo ejecutado dentro del bloque (en este hilo o contexto) no aparece en /metrics"""
+    token = _sin_registro.set(True)
+    try:
+        yield
+    finally:
+        _sin_registro.reset(token)
+
+
+def iniciar_medicion(memoria=False):
+    """
+    Empieza a acumular las etapas de la petición actual. Con memoria=True y tracemalloc
+    activo también el pico de memoria de cada etapa (ver memoria_actual); es lento, solo
+    para benchmarks.
+    """
+    _medicion.set({})
+    _memoria.set({} if memoria else None)
+
+
+def medicion_actual():
+    return _medicion.get() or {}
+
+
+def memoria_actual():
+    """{etapa: bytes} de la medición actual; vacío si no se pidió memoria"""
+    return _memoria.get() or {}
+
+
+def server_timing(medicion):
+    """Valor del header Server-Timing: etapa;dur=milisegundos"""
+    return ', '.join(f"{etapa};dur={segundos * 1000:.1f}" for etapa, segundos in medicion.items())
+
+
+def exponer():
+    """Histogramas en el formato de texto de Prometheus"""
+    with _lock:
+        copia = {etapa: ([*conteos], suma, total) for etapa, (conteos, suma, total) in _histogramas.items()}
+
+    lineas = [
+        f"# HELP {NOMBRE_METRICA} Duración de cada etapa de la generación de reportes.",
+        f"# TYPE {NOMBRE_METRICA} histogram",
+    ]
+    for etapa, (conteos, suma, total) in sorted(copia.items()):
+        acumulado = 0
+        for limite, conteo in zip((*BUCKETS, '+Inf'), conteos):
+            acumulado += conteo
+            lineas.append(f'{NOMBRE_METRICA}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+        lineas.append(f'{NOMBRE_METRICA}_sum{{etapa="{etapa}"}} {suma}')
+        lineas.append(f'{NOMBRE_METRICA}_count{{etapa="{etapa}"}} {total}')
+    return '\n'.join(lineas) + '\n'
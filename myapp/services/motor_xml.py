@@ -0,0 +1,551 @@
+import bisect
+import posixpath
+import re
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+from zipfile import ZipFile
+from openpyxl.cell.cell import ERROR_CODES, ILLEGAL_CHARACTERS_RE
+from openpyxl.compat import safe_string
+from openpyxl.compat.numbers import NUMERIC_TYPES
+from openpyxl.styles import Alignment, Font
+from openpyxl.utils.cell import column_index_from_string, coordinate_to_tuple, get_column_letter
+from openpyxl.utils.exceptions import IllegalCharacterError
+from openpyxl.utils.units import pixels_to_EMU
+from openpyxl.xml.functions import tostring
+from myapp.services.zip_crudo import EscritorZip
+
+# Motor alternativo a openpyxl: la plantilla se trata como un zip cuyas partes se indexan una
+# sola vez; al guardar solo se reescriben las filas con celdas modificadas, los estilos nuevos
+# y los dibujos con las imágenes agregadas. El resto de las partes se copia tal cual, sin
+# descomprimirlas.
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+NS_XDR = 'http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing'
+NS_A = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+REL_DRAWING = NS_REL + '/drawing'
+REL_IMAGE = NS_REL + '/image'
+TIPO_DRAWING = 'application/vnd.openxmlformats-officedocument.drawing+xml'
+CABECERA_XML = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+_FILA = re.compile(r'<row\b([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_CELDA = re.compile(r'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_XF = re.compile(r'<xf\b([^>]*?)(?:/>|>(.*?)</xf>)', re.S)
+_ATRIBUTO = re.compile(r'([\w:]+)="([^"]*)"')
+_REFERENCIA = re.compile(r'([A-Z]{1,3})(\d+)$')
+_RELACION_ID = re.compile(r'\bId="([^"]+)"')
+_CNVPR_ID = re.compile(r'<(?:\w+:)?cNvPr\b[^>]*?\bid="(\d+)"')
+# Elementos que en CT_Worksheet van después de <drawing>
+_DESPUES_DE_DRAWING = re.compile(
+    r'<(?:legacyDrawing|legacyDrawingHF|drawingHF|picture|oleObjects|controls|webPublishItems|tableParts|extLst)\b'
+    r'|</worksheet>')
+
+# Valor de una celda que todavía no se ha asignado (se lee de la plantilla)
+_SIN_CAMBIO = object()
+
+
+class MotorNoCompatible(Exception):
+    """La plantilla tiene una estructura que el motor xml no sabe reescribir."""
+
+
+def _partir(texto, patron, desde=0, hasta=None):
+    """Lista de coincidencias de `patron` que cubren texto[desde:hasta] sin dejar huecos"""
+    hasta = len(texto) if hasta is None else hasta
+    coincidencias = []
+    posicion = desde
+    while posicion < hasta:
+        coincidencia = patron.match(texto, posicion, hasta)
+        if coincidencia is None:
+            raise MotorNoCompatible(f"Contenido no reconocido cerca de: {texto[posicion:posicion + 60]!r}")
+        coincidencias.append(coincidencia)
+        posicion = coincidencia.end()
+    return coincidencias
+
+
+def _atributos(texto):
+    return dict(_ATRIBUTO.findall(texto))
+
+
+def _etiqueta(nombre, atributos, interno=None):
+    abre = '<' + nombre + ''.join(f' {clave}="{valor}"' for clave, valor in atributos.items())
+    return abre + '/>' if not interno else f"{abre}>{interno}</{nombre}>"
+
+
+def _contar(etiqueta, cantidad):
+    """Reemplaza (o agrega) el atributo count de una etiqueta de apertura"""
+    if re.search(r'\bcount="\d*"', etiqueta):
+        return re.sub(r'\bcount="\d*"', f'count="{cantidad}"', etiqueta, count=1)
+    return etiqueta[:-1] + f' count="{cantidad}">'
+
+
+def _resolver(parte, destino):
+    """Ruta dentro del zip del destino de una relación de `parte`"""
+    if destino.startswith('/'):
+        return destino[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(parte), destino))
+
+
+def _ruta_rels(parte):
+    return posixpath.join(posixpath.dirname(parte), '_rels', posixpath.basename(parte) + '.rels')
+
+
+def _relativa(parte, destino):
+    return posixpath.relpath(destino, posixpath.dirname(parte))
+
+
+def _nuevo_id(usados, prefijo='rId'):
+    n = 1
+    while f"{prefijo}{n}" in usados:
+        n += 1
+    usados.add(f"{prefijo}{n}")
+    return f"{prefijo}{n}"
+
+
+def contenido_celda(valor):
+    """
+    Valida `valor` igual que openpyxl al asignarlo a una celda y devuelve
+    (valor guardado, atributo t, xml interno de <c>) tal como openpyxl lo escribiría.
+    """
+    if valor is None or valor == '':
+        return valor, None, ''
+    if isinstance(valor, bool):
+        return valor, 'b', f"<v>{int(valor)}</v>"
+    if isinstance(valor, NUMERIC_TYPES):
+        return valor, None, f"<v>{safe_string(valor)}</v>"
+    if isinstance(valor, str):
+        valor = valor[:32767]
+        if ILLEGAL_CHARACTERS_RE.search(valor):
+            raise IllegalCharacterError(f"{valor} cannot be used in worksheets.")
+        if len(valor) > 1 and valor.startswith('='):
+            return valor, None, f"<f>{escape(valor[1:])}</f><v></v>"
+        if valor in ERROR_CODES:
+            return valor, 'e', f"<v>{escape(valor)}</v>"
+        espacio = ' xml:space="preserve"' if valor != valor.strip() else ''
+        return valor, 'inlineStr', f"<is><t{espacio}>{escape(valor)}</t></is>"
+    # Fechas y demás tipos no llegan desde JSON: se rechazan como openpyxl rechaza lo que no conoce
+    raise ValueError(f"Cannot convert {valor!r} to Excel")
+
+
+class PlantillaXML:
+    """
+    Partes de una plantilla xlsx ya indexadas para el motor xml: filas y celdas de la hoja
+    activa, estilos y dibujo. Se arma una vez por PlantillaCompilada y es solo de lectura.
+    """
+
+    def __init__(self, compilada):
+        self.compilada = compilada
+        with ZipFile(compilada.ruta) as archivo:
+            partes = {info.filename: archivo.read(info) for info in archivo.infolist()}
+        self.nombres = set(partes)
+
+        self.ruta_hoja, self.titulo = self._hoja_activa(partes)
+        if compilada.libro.active.title != self.titulo:
+            raise MotorNoCompatible("La hoja activa no coincide con la de openpyxl.")
+        self._indexar_hoja(partes[self.ruta_hoja].decode('utf-8'))
+        self._indexar_estilos(partes)
+        self._indexar_dibujo(partes)
+        self.tipos = partes['[Content_Types].xml'].decode('utf-8')
+
+    def libro(self):
+        """Libro nuevo para rellenar; no copia nada de la plantilla hasta que se guarda"""
+        return LibroXML(self)
+
+    def _hoja_activa(self, partes):
+        libro = ElementTree.fromstring(partes['xl/workbook.xml'])
+        vista = libro.find(f'{{{NS_MAIN}}}bookViews/{{{NS_MAIN}}}workbookView')
+        activa = int(vista.get('activeTab', 0)) if vista is not None else 0
+        hoja = libro.findall(f'{{{NS_MAIN}}}sheets/{{{NS_MAIN}}}sheet')[activa]
+
+        relaciones = ElementTree.fromstring(partes['xl/_rels/workbook.xml.rels'])
+        for relacion in relaciones:
+            if relacion.get('Id') == hoja.get(f'{{{NS_REL}}}id'):
+                return _resolver('xl/workbook.xml', relacion.get('Target')), hoja.get('name')
+        raise MotorNoCompatible("No se encontró la parte de la hoja activa.")
+
+    def _indexar_hoja(self, texto):
+        inicio = texto.find('<sheetData>')
+        fin = texto.find('</sheetData>')
+        if inicio < 0 or fin < 0:
+            raise MotorNoCompatible("La hoja no tiene <sheetData> con filas.")
+        inicio += len('<sheetData>')
+        self.prefijo = texto[:inicio]
+        self.sufijo = texto[fin:]
+
+        # Por cada fila: número, texto original, apertura sin spans y {columna: texto de la celda}
+        self.numeros, self.textos, self.filas = [], [], []
+        for fila in _partir(texto, _FILA, inicio, fin):
+            atributos = _atributos(fila.group(1))
+            if 'r' not in atributos:
+                raise MotorNoCompatible("Fila sin atributo r.")
+            atributos.pop('spans', None)
+            celdas = {}
+            if fila.group(2):
+                for celda in _partir(fila.group(2), _CELDA):
+                    referencia = _REFERENCIA.match(_atributos(celda.group(1)).get('r', ''))
+                    if referencia is None:
+                        raise MotorNoCompatible("Celda sin atributo r.")
+                    celdas[column_index_from_string(referencia.group(1))] = celda.group(0)
+            numero = int(atributos['r'])
+            if self.numeros and numero <= self.numeros[-1]:
+                raise MotorNoCompatible("Filas fuera de orden.")
+            self.numeros.append(numero)
+            self.textos.append(fila.group(0))
+            self.filas.append((atributos, celdas))
+
+        # Dónde iría <drawing> si la hoja todavía no tiene uno
+        self.posicion_drawing = _DESPUES_DE_DRAWING.search(self.sufijo).start()
+
+    def _indexar_estilos(self, partes):
+        self.ruta_estilos = 'xl/styles.xml'
+        texto = partes[self.ruta_estilos].decode('utf-8')
+        fuentes = re.search(r'(<fonts\b[^>]*>)(.*?)</fonts>', texto, re.S)
+        xfs = re.search(r'(<cellXfs\b[^>]*>)(.*?)</cellXfs>', texto, re.S)
+        if fuentes is None or xfs is None or fuentes.end() > xfs.start():
+            raise MotorNoCompatible("styles.xml sin <fonts> o <cellXfs>.")
+        self.estilos = (texto[:fuentes.start()], fuentes.group(1), fuentes.group(2),
+                        texto[fuentes.end():xfs.start()], xfs.group(1), xfs.group(2), texto[xfs.end():])
+        self.total_fuentes = len(re.findall(r'<font[\s/>]', fuentes.group(2)))
+
+        # Cada xf como (atributos, <alignment>, <protection>) para derivar los estilos nuevos
+        self.xfs = []
+        for xf in _partir(xfs.group(2), _XF):
+            interno = xf.group(2) or ''
+            if re.sub(r'<(alignment|protection)\b[^>]*/>', '', interno).strip():
+                raise MotorNoCompatible("xf con contenido distinto de <alignment> y <protection>.")
+            alineacion = re.search(r'<alignment\b[^>]*/>', interno)
+            proteccion = re.search(r'<protection\b[^>]*/>', interno)
+            self.xfs.append((_atributos(xf.group(1)),
+                             alineacion.group(0) if alineacion else '',
+                             proteccion.group(0) if proteccion else ''))
+
+    def _indexar_dibujo(self, partes):
+        self.ruta_rels_hoja = _ruta_rels(self.ruta_hoja)
+        self.rels_hoja = partes[self.ruta_rels_hoja].decode('utf-8') if self.ruta_rels_hoja in partes else None
+        self.ruta_drawing = None
+        if self.rels_hoja:
+            for relacion in ElementTree.fromstring(self.rels_hoja):
+                if relacion.get('Type') == REL_DRAWING:
+                    self.ruta_drawing = _resolver(self.ruta_hoja, relacion.get('Target'))
+                    break
+
+        if self.ruta_drawing is None:
+            n = 1
+            while f"xl/drawings/drawing{n}.xml" in self.nombres:
+                n += 1
+            self.ruta_drawing = f"xl/drawings/drawing{n}.xml"
+            self.drawing = (f'{CABECERA_XML}<xdr:wsDr xmlns:xdr="{NS_XDR}" xmlns:a="{NS_A}" xmlns:r="{NS_REL}">',
+                            '</xdr:wsDr>')
+            self.drawing_nuevo = True
+            self.ids_imagen = 0
+        else:
+            texto = partes[self.ruta_drawing].decode('utf-8')
+            raiz = re.search(r'<((?:\w+:)?wsDr)\b[^>]*?(/?)>', texto)
+            if raiz is None:
+                raise MotorNoCompatible("Dibujo sin raíz wsDr.")
+            if raiz.group(2):
+                # <xdr:wsDr .../> vacío: se abre para poder agregar anclajes
+                self.drawing = (texto[:raiz.end() - 2] + '>', f'</{raiz.group(1)}>' + texto[raiz.end():])
+            else:
+                cierre = texto.rindex(f'</{raiz.group(1)}>')
+                self.drawing = (texto[:cierre], texto[cierre:])
+            self.drawing_nuevo = False
+            self.ids_imagen = max(map(int, _CNVPR_ID.findall(texto)), default=0)
+
+        self.ruta_rels_drawing = _ruta_rels(self.ruta_drawing)
+        rels = partes.get(self.ruta_rels_drawing)
+        self.rels_drawing = rels.decode('utf-8') if rels is not None else None
+
+
+class LibroXML:
+    """Libro rellenado sobre una PlantillaXML: al guardarlo solo se reescribe lo que cambió."""
+
+    def __init__(self, plantilla):
+        self._plantilla_xml = plantilla
+        self.active = HojaXML(self, plantilla)
+        self.worksheets = [self.active]
+
+    def guardar(self, archivo):
+        """Escribe el xlsx en `archivo` (ruta o archivo binario)"""
+        _Guardado(self._plantilla_xml, self.active).escribir(archivo)
+
+
+class HojaXML:
+    """
+    Hoja activa de un LibroXML con la parte de la API de openpyxl que usan los servicios:
+    ws['A1'], ws.cell(fila, columna), add_image y los índices precalculados de la plantilla.
+    """
+
+    def __init__(self, libro, plantilla):
+        self.parent = libro
+        self.title = plantilla.titulo
+        # indice_plantilla calcula los índices sobre la plantilla original, igual que con openpyxl
+        self._plantilla = plantilla.compilada
+        self._titulo_plantilla = plantilla.titulo
+        self._original = plantilla.compilada.libro[plantilla.titulo]
+        self._celdas = {}
+        self._images = []
+
+    def cell(self, row, column, value=None):
+        celda = self._celdas.get((row, column))
+        if celda is None:
+            celda = self._celdas[(row, column)] = CeldaXML(self, row, column)
+        if value is not None:
+            celda.value = value
+        return celda
+
+    def __getitem__(self, coordenada):
+        return self.cell(*coordinate_to_tuple(coordenada))
+
+    def add_image(self, img, anchor=None):
+        if anchor is not None:
+            img.anchor = anchor
+        self._images.append(img)
+
+
+class CeldaXML:
+    """Celda de una HojaXML: devuelve lo que tiene la plantilla hasta que se le asigna valor o estilo."""
+
+    __slots__ = ('parent', 'row', 'column', '_valor', '_contenido', '_font', '_alignment')
+
+    def __init__(self, hoja, row, column):
+        self.parent = hoja
+        self.row = row
+        self.column = column
+        self._valor = _SIN_CAMBIO
+        self._contenido = None
+        self._font = None
+        self._alignment = None
+
+    @property
+    def coordinate(self):
+        return f"{get_column_letter(self.column)}{self.row}"
+
+    def _original(self):
+        # Solo lectura: la hoja original la comparten todas las peticiones
+        return self.parent._original._cells.get((self.row, self.column))
+
+    @property
+    def value(self):
+        if self._valor is not _SIN_CAMBIO:
+            return self._valor
+        original = self._original()
+        return original.value if original is not None else None
+
+    @value.setter
+    def value(self, valor):
+        self._valor, *self._contenido = contenido_celda(valor)
+
+    @property
+    def font(self):
+        if self._font is not None:
+            return self._font
+        original = self._original()
+        return original.font if original is not None else Font()
+
+    @font.setter
+    def font(self, font):
+        self._font = font
+
+    @property
+    def alignment(self):
+        if self._alignment is not None:
+            return self._alignment
+        original = self._original()
+        return original.alignment if original is not None else Alignment()
+
+    @alignment.setter
+    def alignment(self, alignment):
+        self._alignment = alignment
+
+    @property
+    def modificada(self):
+        return self._valor is not _SIN_CAMBIO or self._font is not None or self._alignment is not None
+
+
+class _Guardado:
+    """Arma las partes que cambian en un guardado de LibroXML y escribe el zip."""
+
+    def __init__(self, plantilla, hoja):
+        self.plantilla = plantilla
+        self.hoja = hoja
+        self.fuentes = []
+        self.xfs = []
+        self._fuentes_nuevas = {}
+        self._xfs_nuevos = {}
+        self._xfs_por_id = {}
+
+    def escribir(self, archivo):
+        plantilla = self.plantilla
+        reemplazos = {plantilla.ruta_hoja: self._hoja_xml()}
+        nuevas = {}
+
+        if self.xfs:
+            reemplazos[plantilla.ruta_estilos] = self._estilos_xml()
+        if self.hoja._images:
+            self._dibujo(reemplazos, nuevas)
+
+        # Las partes sin cambios se copian con los bytes ya comprimidos de la plantilla
+        destino = EscritorZip(archivo)
+        for entrada in plantilla.compilada.entradas:
+            if entrada.nombre in reemplazos:
+                destino.writestr(entrada.nombre, reemplazos[entrada.nombre])
+            else:
+                destino.copiar(entrada)
+        for nombre, datos in nuevas.items():
+            destino.writestr(nombre, datos)
+        destino.close()
+
+    def _hoja_xml(self):
+        plantilla = self.plantilla
+        modificadas = {}
+        for celda in self.hoja._celdas.values():
+            if celda.modificada:
+                modificadas.setdefault(celda.row, []).append(celda)
+
+        partes = [plantilla.prefijo]
+        siguiente = 0
+        sufijo = plantilla.sufijo
+        for numero in sorted(modificadas):
+            indice = bisect.bisect_left(plantilla.numeros, numero)
+            partes.extend(plantilla.textos[siguiente:indice])
+            if indice < len(plantilla.numeros) and plantilla.numeros[indice] == numero:
+                atributos, celdas = plantilla.filas[indice]
+                siguiente = indice + 1
+            else:
+                atributos, celdas = {'r': str(numero)}, {}
+                siguiente = indice
+            celdas = dict(celdas)
+            for celda in modificadas[numero]:
+                celdas[celda.column] = self._celda_xml(celda, celdas.get(celda.column))
+            partes.append(_etiqueta('row', atributos, ''.join(celdas[c] for c in sorted(celdas))))
+        partes.extend(plantilla.textos[siguiente:])
+
+        if self.hoja._images and plantilla.drawing_nuevo:
+            # La hoja no tenía dibujo: se referencia el nuevo con el primer id libre de sus relaciones
+            self.id_drawing = _nuevo_id(set(_RELACION_ID.findall(plantilla.rels_hoja or '')))
+            posicion = plantilla.posicion_drawing
+            sufijo = f'{sufijo[:posicion]}<drawing xmlns:r="{NS_REL}" r:id="{self.id_drawing}"/>{sufijo[posicion:]}'
+        partes.append(sufijo)
+        return ''.join(partes).encode('utf-8')
+
+    def _celda_xml(self, celda, original):
+        atributos = {'r': celda.coordinate}
+        t, interno = None, ''
+        estilo = 0
+        if original is not None:
+            coincidencia = _CELDA.match(original)
+            anteriores = _atributos(coincidencia.group(1))
+            estilo = int(anteriores.get('s', 0))
+            t, interno = anteriores.get('t'), coincidencia.group(2) or ''
+        if celda._valor is not _SIN_CAMBIO:
+            t, interno = celda._contenido
+
+        if celda._font is not None or celda._alignment is not None:
+            estilo = self._xf(estilo, celda._font, celda._alignment)
+        if estilo:
+            atributos['s'] = str(estilo)
+        if t:
+            atributos['t'] = t
+        return _etiqueta('c', atributos, interno)
+
+    def _xf(self, base, font, alignment):
+        """Índice de un xf nuevo: el de la celda con la fuente y/o alineación reemplazadas"""
+        # Los estilos compartidos (myapp.services.estilos) se reconocen por identidad, sin calcular su hash;
+        # las celdas siguen vivas durante el guardado, así que los id no se repiten
+        clave_id = (base, id(font), id(alignment))
+        indice = self._xfs_por_id.get(clave_id)
+        if indice is None:
+            indice = self._xfs_por_id[clave_id] = self._xf_nuevo(base, font, alignment)
+        return indice
+
+    def _xf_nuevo(self, base, font, alignment):
+        clave = (base, font, alignment)
+        indice = self._xfs_nuevos.get(clave)
+        if indice is not None:
+            return indice
+
+        atributos, alineacion, proteccion = self.plantilla.xfs[base]
+        atributos = dict(atributos)
+        if font is not None:
+            atributos['fontId'] = str(self._fuente(font))
+            atributos['applyFont'] = '1'
+        if alignment is not None:
+            alineacion = tostring(alignment.to_tree()).decode('utf-8')
+            atributos['applyAlignment'] = '1'
+        self.xfs.append(_etiqueta('xf', atributos, alineacion + proteccion))
+        indice = self._xfs_nuevos[clave] = len(self.plantilla.xfs) + len(self.xfs) - 1
+        return indice
+
+    def _fuente(self, font):
+        indice = self._fuentes_nuevas.get(font)
+        if indice is None:
+            self.fuentes.append(tostring(font.to_tree()).decode('utf-8'))
+            indice = self._fuentes_nuevas[font] = self.plantilla.total_fuentes + len(self.fuentes) - 1
+        return indice
+
+    def _estilos_xml(self):
+        plantilla = self.plantilla
+        antes, abre_fuentes, fuentes, entre, abre_xfs, xfs, despues = plantilla.estilos
+        return ''.join([
+            antes, _contar(abre_fuentes, plantilla.total_fuentes + len(self.fuentes)), fuentes, *self.fuentes, '</fonts>',
+            entre, _contar(abre_xfs, len(plantilla.xfs) + len(self.xfs)), xfs, *self.xfs, '</cellXfs>', despues,
+        ]).encode('utf-8')
+
+    def _dibujo(self, reemplazos, nuevas):
+        plantilla = self.plantilla
+        rels = plantilla.rels_drawing or f'{CABECERA_XML}<Relationships xmlns="{NS_PKG_REL}"></Relationships>'
+        ids = set(_RELACION_ID.findall(rels))
+        nombres = set(plantilla.nombres)
+        tipos = plantilla.tipos
+
+        # Cada contenido distinto se guarda una vez, con una relación desde el dibujo
+        medias = {}
+        relaciones = []
+        anclajes = []
+        for n, img in enumerate(self.hoja._images, plantilla.ids_imagen + 1):
+            media = img.media
+            if media.huella not in medias:
+                extension = 'jpeg' if media.formato == 'jpg' else media.formato
+                i = 1
+                while f"xl/media/image{i}.{extension}" in nombres:
+                    i += 1
+                ruta = f"xl/media/image{i}.{extension}"
+                nombres.add(ruta)
+                nuevas[ruta] = media.datos
+                medias[media.huella] = id_relacion = _nuevo_id(ids)
+                relaciones.append(f'<Relationship Id="{id_relacion}" Type="{REL_IMAGE}" '
+                                  f'Target="{_relativa(plantilla.ruta_drawing, ruta)}"/>')
+                if not re.search(rf'<Default\b[^>]*Extension="{extension}"', tipos, re.I):
+                    tipos = tipos.replace('</Types>', f'<Default Extension="{extension}" ContentType="image/{extension}"/></Types>')
+            anclajes.append(self._anclaje(img, n, medias[media.huella]))
+
+        antes, despues = plantilla.drawing
+        (nuevas if plantilla.drawing_nuevo else reemplazos)[plantilla.ruta_drawing] = (antes + ''.join(anclajes) + despues).encode('utf-8')
+        rels = rels.replace('</Relationships>', ''.join(relaciones) + '</Relationships>')
+        (reemplazos if plantilla.rels_drawing else nuevas)[plantilla.ruta_rels_drawing] = rels.encode('utf-8')
+
+        if plantilla.drawing_nuevo:
+            rels_hoja = plantilla.rels_hoja or f'{CABECERA_XML}<Relationships xmlns="{NS_PKG_REL}"></Relationships>'
+            relacion = (f'<Relationship Id="{self.id_drawing}" Type="{REL_DRAWING}" '
+                        f'Target="{_relativa(plantilla.ruta_hoja, plantilla.ruta_drawing)}"/>')
+            rels_hoja = rels_hoja.replace('</Relationships>', relacion + '</Relationships>')
+            (reemplazos if plantilla.rels_hoja else nuevas)[plantilla.ruta_rels_hoja] = rels_hoja.encode('utf-8')
+            tipos = tipos.replace('</Types>', f'<Override PartName="/{plantilla.ruta_drawing}" ContentType="{TIPO_DRAWING}"/></Types>')
+
+        if tipos != plantilla.tipos:
+            reemplazos['[Content_Types].xml'] = tipos.encode('utf-8')
+
+    @staticmethod
+    def _anclaje(img, n, id_relacion):
+        """oneCellAnchor igual al que escribe openpyxl para una imagen anclada en una celda"""
+        fila, columna = coordinate_to_tuple(img.anchor.upper())
+        return (
+            f'<xdr:oneCellAnchor xmlns:xdr="{NS_XDR}" xmlns:a="{NS_A}" xmlns:r="{NS_REL}">'
+            f'<xdr:from><xdr:col>{columna - 1}</xdr:col><xdr:colOff>0</xdr:colOff>'
+            f'<xdr:row>{fila - 1}</xdr:row><xdr:rowOff>0</xdr:rowOff></xdr:from>'
+            f'<xdr:ext cx="{pixels_to_EMU(img.width)}" cy="{pixels_to_EMU(img.height)}"/>'
+            f'<xdr:pic><xdr:nvPicPr><xdr:cNvPr id="{n}" name="Image {n}" descr="Picture"/><xdr:cNvPicPr/></xdr:nvPicPr>'
+            f'<xdr:blipFill><a:blip cstate="print" r:embed="{id_relacion}"/><a:stretch><a:fillRect/></a:stretch></xdr:blipFill>'
+            f'<xdr:spPr><a:prstGeom prst="rect"/></xdr:spPr></xdr:pic><xdr:clientData/></xdr:oneCellAnchor>'
+        )
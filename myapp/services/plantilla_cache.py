@@ -0,0 +1,134 @@
+import logging
+import os
+import pickle
+import threading
+import warnings
+from openpyxl import load_workbook
+from myapp.services.metricas import medir
+from myapp.services.motor_xml import PlantillaXML
+from myapp.services.zip_crudo import leer_entradas
+from myapp.services.xlsx_writer import compartir_imagen, copiar_imagen
+
+# Plantillas ya parseadas, una entrada por ruta. Vive en memoria del worker.
+_plantillas = {}
+_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class PlantillaCompilada:
+    """Plantilla parseada una sola vez y serializada para copiarla barato en cada petición."""
+
+    def __init__(self, ruta, mtime):
+        self.ruta = ruta
+        self.mtime = mtime
+        # Libro original, solo de lectura: de aquí salen los índices precalculados
+        self.libro = load_workbook(ruta)
+        # Entradas del xlsx con sus bytes ya comprimidos, para copiarlas al guardar sin recomprimir
+        self.entradas = leer_entradas(ruta)
+        # pickle.loads de un workbook ya armado es mucho más rápido que volver a parsear el xlsx
+        self.datos = pickle.dumps(self.libro, protocol=pickle.HIGHEST_PROTOCOL)
+        self._indices = {}
+        self._lock = threading.Lock()
+        # PlantillaXML para el motor xml; False si la plantilla no es compatible
+        self._xml = None
+
+    def copia(self):
+        """Devuelve un workbook nuevo e independiente, listo para rellenar."""
+        wb = pickle.loads(self.datos)
+        for ws in wb.worksheets:
+            ws._plantilla = self
+            ws._titulo_plantilla = ws.title
+        return wb
+
+    def plantilla_xml(self):
+        """Partes de la plantilla indexadas para el motor xml (una sola vez), o None si no es compatible."""
+        if self._xml is None:
+            with self._lock:
+                if self._xml is None:
+                    try:
+                        self._xml = PlantillaXML(self)
+                    except Exception as e:
+                        logger.warning("La plantilla %s no es compatible con el motor xml, se usa openpyxl: %s", self.ruta, e)
+                        self._xml = False
+        return self._xml or None
+
+    def indice(self, titulo, nombre, construir):
+        """Calcula una sola vez `construir(hoja)` sobre la hoja original y lo comparte entre las copias."""
+        clave = (titulo, nombre)
+        indice = self._indices.get(clave)
+        if indice is None:
+            with self._lock:
+                indice = self._indices.get(clave)
+                if indice is None:
+                    indice = construir(self.libro[titulo])
+                    self._indices[clave] = indice
+        return indice
+
+
+def obtener_plantilla_compilada(ruta):
+    """Obtiene la plantilla compilada para `ruta`, recargándola si el archivo cambió en disco."""
+    mtime = os.stat(ruta).st_mtime_ns  # Lanza FileNotFoundError si la plantilla no existe
+
+    plantilla = _plantillas.get(ruta)
+    if plantilla is not None and plantilla.mtime == mtime:
+        return plantilla
+
+    with _lock:
+        plantilla = _plantillas.get(ruta)
+        if plantilla is None or plantilla.mtime != mtime:
+            plantilla = PlantillaCompilada(ruta, mtime)
+            _plantillas[ruta] = plantilla
+    return plantilla
+
+
+def cargar_plantilla(ruta, motor='openpyxl'):
+    """
+    Reemplazo de load_workbook(ruta): devuelve una copia fresca de la plantilla cacheada.
+    Con motor='xml' devuelve un LibroXML, que al guardarse solo reescribe lo modificado.
+    """
+    with medir('plantilla'):
+        plantilla = obtener_plantilla_compilada(ruta)
+        if motor == 'xml':
+            plantilla_xml = plantilla.plantilla_xml()
+            if plantilla_xml is not None:
+                return plantilla_xml.libro()
+        return plantilla.copia()
+
+
+def indice_plantilla(ws, nombre, construir):
+    """
+    Devuelve el índice `nombre` de la hoja, calculado con `construir(hoja)` sobre la plantilla
+    sin rellenar y cacheado junto a ella. Para hojas que no vienen de la cache se calcula
+    una vez sobre la propia hoja.
+    """
+    plantilla = getattr(ws, '_plantilla', None)
+    if plantilla is not None:
+        return plantilla.indice(ws._titulo_plantilla, nombre, construir)
+
+    indices = getattr(ws, '_indices', None)
+    if indices is None:
+        indices = ws._indices = {}
+    if nombre not in indices:
+        indices[nombre] = construir(ws)
+    return indices[nombre]
+
+
+def clonar_hoja(ws):
+    """
+    Copia una hoja todavía sin rellenar dentro de su mismo libro. La copia comparte los
+    índices precalculados de la plantilla y las imágenes propias de la plantilla (cada una
+    queda guardada una sola vez en el xlsx).
+    """
+    with warnings.catch_warnings():
+        # El título provisional "<título> Copy" puede pasar de 31 caracteres; quien clona lo renombra
+        warnings.simplefilter('ignore', UserWarning)
+        clon = ws.parent.copy_worksheet(ws)
+    if getattr(ws, '_plantilla', None) is not None:
+        clon._plantilla = ws._plantilla
+        clon._titulo_plantilla = ws._titulo_plantilla
+
+    # copy_worksheet no copia imágenes
+    ws._images = [compartir_imagen(img) for img in ws._images]
+    clon._images = [copiar_imagen(img) for img in ws._images]
+    return clon
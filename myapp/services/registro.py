@@ -0,0 +1,51 @@
+import contextvars
+import logging
+import os
+import random
+import re
+import uuid
+
+# Nivel de los mensajes de la aplicación; por defecto solo advertencias y errores
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'WARNING').upper()
+# Fracción de peticiones (0 a 1) que escriben sus mensajes DEBUG/INFO; WARNING y ERROR siempre se escriben
+LOG_MUESTREO = float(os.environ.get('LOG_MUESTREO', 1))
+FORMATO = '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s'
+
+# (id de la petición, si sus mensajes de detalle se escriben)
+_peticion = contextvars.ContextVar('peticion', default=('-', True))
+_ID_VALIDO = re.compile(r'^[\w.\-]{1,64}$')
+
+
+class FiltroPeticion(logging.Filter):
+    """Agrega el id de la petición a cada línea y descarta el detalle de las peticiones no muestreadas"""
+
+    def filter(self, record):
+        request_id, muestreada = _peticion.get()
+        record.request_id = request_id
+        return muestreada or record.levelno >= logging.WARNING
+
+
+def configurar_logging():
+    """Configura una sola vez el logger 'myapp', del que cuelgan los de todos los módulos"""
+    logger = logging.getLogger('myapp')
+    if any(isinstance(f, FiltroPeticion) for h in logger.handlers for f in h.filters):
+        return logger
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(FORMATO))
+    handler.addFilter(FiltroPeticion())
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+    return logger
+
+
+def iniciar_peticion(request_id=None):
+    """
+    Asocia un id (el recibido en X-Request-ID si es válido, o uno nuevo) a los mensajes de la
+    petición actual y decide si sus mensajes de detalle se escriben. Devuelve el id.
+    """
+    if not request_id or not _ID_VALIDO.match(request_id):
+        request_id = uuid.uuid4().hex[:16]
+    _peticion.set((request_id, random.random() < LOG_MUESTREO))
+    return request_id
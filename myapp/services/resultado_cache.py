@@ -0,0 +1,61 @@
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import time
+from myapp.services.imagen_cache import CacheDisco, CacheDosNiveles, CacheMemoria
+
+# Segundos que se sirve un xlsx ya generado; las imágenes del payload (firmas) pueden cambiar
+# detrás de la misma URL, así que no conviene que pase mucho del IMAGEN_CACHE_TTL. 0 desactiva la cache.
+RESULTADOS_CACHE_TTL = int(os.environ.get('RESULTADOS_CACHE_TTL', 300))
+RESULTADOS_CACHE_MAX_MB = int(os.environ.get('RESULTADOS_CACHE_MAX_MB', 32))
+RESULTADOS_CACHE_DISCO_MAX_MB = int(os.environ.get('RESULTADOS_CACHE_DISCO_MAX_MB', 256))
+# Directorio del nivel en disco, compartido entre workers; vacío para desactivarlo
+RESULTADOS_CACHE_DIR = os.environ.get(
+    'RESULTADOS_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'llenar_formulario_resultados'))
+
+_cache = CacheDosNiveles(
+    CacheMemoria(RESULTADOS_CACHE_MAX_MB * 1024 * 1024),
+    CacheDisco(RESULTADOS_CACHE_DIR, RESULTADOS_CACHE_DISCO_MAX_MB * 1024 * 1024, extension='.xlsx')
+    if RESULTADOS_CACHE_DIR else None
+)
+
+# Cada entrada guarda el momento en que se generó delante del xlsx
+_MARCA = struct.Struct('>d')
+
+
+def version_plantilla(layout):
+    """Identifica la plantilla y su especificación: si cambia cualquiera, cambian las claves"""
+    info = os.stat(layout['ruta'])  # Lanza FileNotFoundError si la plantilla no existe
+    especificacion = json.dumps(layout, sort_keys=True)
+    return f"{info.st_mtime_ns}:{info.st_size}:{hashlib.sha256(especificacion.encode('utf-8')).hexdigest()}"
+
+
+def clave_resultado(tipo, data, demo, layout):
+    """
+    Hash del JSON de la petición en forma canónica (claves ordenadas, sin espacios) junto
+    con el tipo de reporte, el modo demo y la versión de la plantilla. Se calcula antes
+    de generar, porque los servicios modifican `data`.
+    """
+    canonico = json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    base = f"{tipo}|{int(bool(demo))}|{version_plantilla(layout)}|{canonico}"
+    return hashlib.sha256(base.encode('utf-8')).hexdigest()
+
+
+def obtener_resultado(clave):
+    """Bytes del xlsx generado antes para `clave`, o None si no está o ya venció"""
+    if RESULTADOS_CACHE_TTL <= 0:
+        return None
+    valor = _cache.obtener(clave)
+    if valor is None or len(valor) < _MARCA.size:
+        return None
+    (generado,) = _MARCA.unpack_from(valor)
+    if time.time() - generado > RESULTADOS_CACHE_TTL:
+        return None
+    return valor[_MARCA.size:]
+
+
+def guardar_resultado(clave, contenido):
+    if RESULTADOS_CACHE_TTL > 0:
+        _cache.guardar(clave, _MARCA.pack(time.time()) + contenido)
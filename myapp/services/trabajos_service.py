@@ -0,0 +1,148 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from myapp.services.excel_service import registrar_sin_fila
+from myapp.services.imagen_service import registrar_fallidas
+
+# Hilos que generan trabajos en segundo plano dentro de cada worker
+TRABAJOS_HILOS = int(os.environ.get('TRABAJOS_HILOS', 2))
+# Máximo de trabajos en cola o en proceso por worker; por encima se rechaza (429)
+TRABAJOS_MAX_COLA = int(os.environ.get('TRABAJOS_MAX_COLA', 20))
+# Segundos que se conservan los resultados en disco
+TRABAJOS_TTL = int(os.environ.get('TRABAJOS_TTL', 3600))
+# Segundos sin cambios de estado tras los cuales un trabajo en cola o procesando se da por perdido
+# (p. ej. el worker que lo tenía se reinició) y se marca como error
+TRABAJOS_TIMEOUT = int(os.environ.get('TRABAJOS_TIMEOUT', 900))
+# Estado y resultado de cada trabajo viven en disco, así cualquier worker puede responder las consultas
+TRABAJOS_DIR = os.environ.get('TRABAJOS_DIR', os.path.join(tempfile.gettempdir(), 'llenar_formulario_trabajos'))
+
+_executor = ThreadPoolExecutor(max_workers=TRABAJOS_HILOS, thread_name_prefix='trabajo')
+_cupos = threading.BoundedSemaphore(TRABAJOS_MAX_COLA)
+_ID_VALIDO = re.compile(r'^[0-9a-f]{32}$')
+
+logger = logging.getLogger(__name__)
+
+
+class ColaLlena(Exception):
+    """No hay cupo para más trabajos en este worker"""
+
+
+def _ruta(trabajo_id, extension):
+    return os.path.join(TRABAJOS_DIR, f"{trabajo_id}.{extension}")
+
+
+def _escribir(ruta, contenido):
+    # Escritura atómica: quien consulta nunca ve un archivo a medias
+    fd, temporal = tempfile.mkstemp(dir=TRABAJOS_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def _guardar_estado(estado):
+    estado['actualizado'] = time.time()
+    _escribir(_ruta(estado['id'], 'json'), json.dumps(estado, ensure_ascii=False).encode('utf-8'))
+
+
+def limpiar_vencidos():
+    """Borra estados y resultados de trabajos más viejos que TRABAJOS_TTL"""
+    limite = time.time() - TRABAJOS_TTL
+    for entrada in os.scandir(TRABAJOS_DIR):
+        try:
+            if entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+        except OSError:
+            pass
+
+
+def _ejecutar(estado, generar):
+    try:
+        estado['estado'] = 'procesando'
+        _guardar_estado(estado)
+
+        with registrar_fallidas() as fallidas, registrar_sin_fila() as sin_fila:
+            resultado = generar()
+        if resultado is None:
+            raise RuntimeError("No se pudo generar el archivo.")
+        _escribir(_ruta(estado['id'], 'bin'), resultado.getvalue())
+        estado['estado'] = 'terminado'
+        if fallidas:
+            # Resultado parcial: se entrega, pero el estado lo informa
+            estado['imagenes_fallidas'] = len(fallidas)
+        if sin_fila:
+            estado['items_sin_fila'] = sin_fila
+    except Exception as e:
+        logger.error("Error en el trabajo %s: %s", estado['id'], e)
+        estado['estado'] = 'error'
+        estado['error'] = str(e)
+    finally:
+        try:
+            _guardar_estado(estado)
+        except OSError as e:
+            logger.error("No se pudo guardar el estado del trabajo %s: %s", estado['id'], e)
+        finally:
+            # El cupo se devuelve aunque falle el disco; si no, el worker terminaría rechazando todo con 429
+            _cupos.release()
+
+
+def encolar(generar, archivo, mimetype):
+    """
+    Encola `generar()` (devuelve un BytesIO) y retorna el estado inicial del trabajo.
+    Lanza ColaLlena si el worker ya tiene TRABAJOS_MAX_COLA trabajos pendientes.
+    """
+    if not _cupos.acquire(blocking=False):
+        raise ColaLlena("Hay demasiados trabajos en cola, intente más tarde.")
+
+    try:
+        os.makedirs(TRABAJOS_DIR, exist_ok=True)
+        limpiar_vencidos()
+        estado = {
+            'id': uuid.uuid4().hex,
+            'estado': 'en_cola',
+            'creado': time.time(),
+            'archivo': archivo,
+            'mimetype': mimetype,
+            'error': None,
+        }
+        _guardar_estado(estado)
+        respuesta = dict(estado)
+        # El trabajo conserva el id de la petición que lo creó en sus mensajes
+        _executor.submit(contextvars.copy_context().run, _ejecutar, estado, generar)
+    except Exception:
+        _cupos.release()
+        raise
+    return respuesta
+
+
+def obtener_estado(trabajo_id):
+    """Estado guardado del trabajo, o None si no existe o ya venció"""
+    if not _ID_VALIDO.match(trabajo_id):
+        return None
+    try:
+        with open(_ruta(trabajo_id, 'json'), encoding='utf-8') as archivo:
+            estado = json.load(archivo)
+    except (OSError, ValueError):
+        return None
+
+    pendiente = estado['estado'] in ('en_cola', 'procesando')
+    if pendiente and time.time() - estado.get('actualizado', estado['creado']) > TRABAJOS_TIMEOUT:
+        # Ningún worker lo va a terminar: se informa como error en lugar de quedar pendiente hasta el TTL
+        estado['estado'] = 'error'
+        estado['error'] = "El trabajo se interrumpió antes de terminar (reinicio del worker o tiempo agotado)."
+        try:
+            _guardar_estado(estado)
+        except OSError as e:
+            logger.error("No se pudo guardar el estado del trabajo %s: %s", trabajo_id, e)
+    return estado
+
+
+def ruta_resultado(trabajo_id):
+    """Ruta del archivo generado por un trabajo terminado"""
+    return _ruta(trabajo_id, 'bin')
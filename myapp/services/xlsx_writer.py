@@ -0,0 +1,118 @@
+import copy
+import datetime
+import hashlib
+import io
+from openpyxl.drawing.image import Image as XLImage
+from openpyxl.writer.excel import ExcelWriter
+from myapp.services.metricas import medir
+from myapp.services.motor_xml import LibroXML
+from myapp.services.zip_crudo import EscritorZip
+
+
+class MediaCompartida:
+    """Un archivo de xl/media que pueden referenciar varias imágenes del mismo libro."""
+
+    def __init__(self, datos, formato='png'):
+        self.datos = datos
+        self.formato = formato
+        # Ruta dentro del xlsx; la asigna el primer anclaje que se escribe en cada guardado
+        self.path = None
+        self._huella = None
+
+    @property
+    def huella(self):
+        """Identifica el contenido: dos medias con la misma huella son el mismo archivo"""
+        if self._huella is None:
+            self._huella = (self.formato, len(self.datos), hashlib.blake2b(self.datos, digest_size=16).digest())
+        return self._huella
+
+
+class ImagenCompartida(XLImage):
+    """
+    Imagen anclada en una celda cuyo contenido vive en una MediaCompartida: el mismo
+    logo o firma puesto en varias celdas u hojas se guarda una sola vez en el xlsx.
+    """
+
+    def __init__(self, media, width, height):
+        # No se llama a XLImage.__init__: no hace falta abrir la imagen con PIL en cada anclaje
+        self.media = media
+        self.ref = None
+        self.format = media.formato
+        self.width = width
+        self.height = height
+
+    def _data(self):
+        return self.media.datos
+
+    @property
+    def path(self):
+        if self.media.path is None:
+            self.media.path = self._path.format(self._id, self.format)
+        return self.media.path
+
+
+def media_del_libro(wb, datos, formato='png'):
+    """
+    MediaCompartida del libro con estos `datos`: la misma imagen insertada en varias celdas
+    u hojas (aunque venga de URLs distintas) queda como un solo archivo de xl/media.
+    """
+    medias = getattr(wb, '_medias', None)
+    if medias is None:
+        medias = wb._medias = {}
+    media = MediaCompartida(datos, formato)
+    return medias.setdefault(media.huella, media)
+
+
+def compartir_imagen(img):
+    """Convierte una imagen cargada de la plantilla en ImagenCompartida en la misma posición"""
+    if isinstance(img, ImagenCompartida):
+        return img
+    # Leer sin cerrar el buffer original (XLImage._data lo cierra después de leerlo)
+    datos = img.ref.getvalue() if hasattr(img.ref, 'getvalue') else img._data()
+    compartida = ImagenCompartida(MediaCompartida(datos, img.format), img.width, img.height)
+    compartida.anchor = img.anchor
+    return compartida
+
+
+def copiar_imagen(img):
+    """Otro anclaje de la misma ImagenCompartida (mismo archivo de xl/media)"""
+    nueva = ImagenCompartida(img.media, img.width, img.height)
+    nueva.anchor = copy.deepcopy(img.anchor)
+    return nueva
+
+
+class ExcelWriterCompartido(ExcelWriter):
+    """ExcelWriter que escribe una sola vez cada MediaCompartida aunque tenga varios anclajes."""
+
+    def write_data(self):
+        # Las rutas de xl/media se asignan de nuevo en cada guardado; las medias con el mismo
+        # contenido (p. ej. una imagen de la plantilla repetida al rellenar) se unen en una
+        unicas = {}
+        for ws in self.workbook.worksheets:
+            for img in ws._images:
+                if isinstance(img, ImagenCompartida):
+                    img.media = unicas.setdefault(img.media.huella, img.media)
+                    img.media.path = None
+        super().write_data()
+
+    def _write_images(self):
+        escritas = set()
+        for img in self._images:
+            if img.path not in escritas:
+                escritas.add(img.path)
+                self._archive.writestr(img.path[1:], img._data())
+
+
+def guardar_libro(wb):
+    """Reemplazo de wb.save(buffer): guarda el libro en memoria y devuelve el BytesIO al inicio"""
+    excel_buffer = io.BytesIO()
+    with medir('guardado'):
+        if isinstance(wb, LibroXML):
+            wb.guardar(excel_buffer)
+        else:
+            # Las partes que salen iguales a las de la plantilla (o a un guardado anterior) no se recomprimen
+            archive = EscritorZip(excel_buffer)
+            wb.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+            ExcelWriterCompartido(wb, archive).save()
+    excel_buffer.seek(0)
+    return excel_buffer
@@ -0,0 +1,163 @@
+import hashlib
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+
+# Nivel de deflate (1 = más rápido, 9 = más pequeño) para las partes del xlsx que sí hay que comprimir
+XLSX_NIVEL_COMPRESION = int(os.environ.get('XLSX_NIVEL_COMPRESION', 6))
+# Partes ya comprimidas que se recuerdan por contenido: las de las plantillas y las generadas que se repiten
+ZIP_CACHE_MAX_MB = int(os.environ.get('ZIP_CACHE_MAX_MB', 16))
+# Formatos que ya vienen comprimidos: deflate no les quita nada, se guardan tal cual
+SIN_COMPRIMIR = ('.png', '.jpg', '.jpeg', '.gif')
+
+# Una entrada del zip con sus bytes ya comprimidos (crudo), lista para copiarse sin descomprimir
+EntradaZip = namedtuple('EntradaZip', 'nombre metodo crc tamano crudo fecha')
+
+_LIMITE_ZIP32 = 0xFFFFFFFF
+
+
+def comprimir(nombre, datos, nivel=XLSX_NIVEL_COMPRESION, fecha=None):
+    """Arma la EntradaZip de `datos` (bytes o str) comprimiéndola con deflate al `nivel` indicado"""
+    if isinstance(datos, str):
+        datos = datos.encode('utf-8')
+    if datos and not nombre.lower().endswith(SIN_COMPRIMIR):
+        compresor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+        metodo, crudo = ZIP_DEFLATED, compresor.compress(datos) + compresor.flush()
+    else:
+        metodo, crudo = ZIP_STORED, datos
+    return EntradaZip(nombre, metodo, zlib.crc32(datos), len(datos), crudo, fecha or time.localtime()[:6])
+
+
+class CacheComprimidas:
+    """LRU de EntradaZip por (nombre, contenido): la misma parte no se vuelve a comprimir."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clave(nombre, datos):
+        return nombre, len(datos), hashlib.blake2b(datos, digest_size=16).digest()
+
+    def comprimir(self, nombre, datos, nivel=XLSX_NIVEL_COMPRESION):
+        if isinstance(datos, str):
+            datos = datos.encode('utf-8')
+        clave = self._clave(nombre, datos)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                self._entradas.move_to_end(clave)
+                return entrada
+        entrada = comprimir(nombre, datos, nivel)
+        self.guardar(clave, entrada)
+        return entrada
+
+    def registrar(self, entrada, datos):
+        """Recuerda una entrada que ya viene comprimida (por ejemplo, de una plantilla)"""
+        self.guardar(self._clave(entrada.nombre, datos), entrada)
+
+    def guardar(self, clave, entrada):
+        if len(entrada.crudo) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior.crudo)
+            self._entradas[clave] = entrada
+            self._bytes += len(entrada.crudo)
+            while self._bytes > self.max_bytes:
+                _, expulsada = self._entradas.popitem(last=False)
+                self._bytes -= len(expulsada.crudo)
+
+
+_cache = CacheComprimidas(ZIP_CACHE_MAX_MB * 1024 * 1024)
+
+
+def leer_entradas(ruta):
+    """
+    Lee todas las entradas del zip en `ruta` sin descomprimirlas y las deja en la cache de
+    comprimidas, así las partes que openpyxl vuelva a escribir idénticas se copian tal cual.
+    """
+    entradas = []
+    with ZipFile(ruta) as archivo, open(ruta, 'rb') as crudo:
+        for info in archivo.infolist():
+            datos = archivo.read(info)
+            if info.compress_type not in (ZIP_STORED, ZIP_DEFLATED) or info.flag_bits & 0x1:
+                # Otro método o cifrada: se recomprime una sola vez aquí
+                entrada = comprimir(info.filename, datos, fecha=info.date_time)
+            else:
+                crudo.seek(info.header_offset)
+                largo_nombre, largo_extra = struct.unpack('<2H', crudo.read(30)[26:30])
+                crudo.seek(info.header_offset + 30 + largo_nombre + largo_extra)
+                entrada = EntradaZip(info.filename, info.compress_type, info.CRC, info.file_size,
+                                     crudo.read(info.compress_size), info.date_time)
+            _cache.registrar(entrada, datos)
+            entradas.append(entrada)
+    return entradas
+
+
+def _fecha_dos(fecha):
+    año, mes, dia, hora, minuto, segundo = fecha
+    return (hora << 11) | (minuto << 5) | (segundo // 2), (max(año, 1980) - 1980) << 9 | (mes << 5) | dia
+
+
+class EscritorZip:
+    """
+    Escribe un zip con la interfaz que ExcelWriter espera de su archivo (writestr, write,
+    namelist, close). Las partes ya comprimidas antes (de la plantilla o de otro guardado con
+    el mismo contenido) se copian sin volver a pasar por deflate.
+    """
+
+    def __init__(self, archivo, nivel=XLSX_NIVEL_COMPRESION):
+        self.archivo = archivo
+        self.nivel = nivel
+        self._posicion = 0
+        self._central = []
+        self._nombres = []
+
+    def _escribir(self, datos):
+        self.archivo.write(datos)
+        self._posicion += len(datos)
+
+    def copiar(self, entrada):
+        """Agrega una EntradaZip tal como está comprimida"""
+        if max(self._posicion, len(entrada.crudo), entrada.tamano) > _LIMITE_ZIP32:
+            raise ValueError("El xlsx supera el tamaño de un zip sin zip64.")
+        nombre = entrada.nombre.encode('utf-8')
+        # Bit 11: nombre en UTF-8
+        banderas = 0 if nombre.isascii() else 0x800
+        hora, fecha = _fecha_dos(entrada.fecha)
+        comunes = (banderas, entrada.metodo, hora, fecha, entrada.crc, len(entrada.crudo), entrada.tamano, len(nombre))
+        atributos = (0o40775 << 16) | 0x10 if entrada.nombre.endswith('/') else 0o600 << 16
+
+        self._central.append(
+            struct.pack('<4s6H3L5H2L', b'PK\x01\x02', (3 << 8) | 20, 20, *comunes, 0, 0, 0, 0, atributos, self._posicion)
+            + nombre)
+        self._escribir(struct.pack('<4s5H3L2H', b'PK\x03\x04', 20, *comunes, 0) + nombre)
+        self._escribir(entrada.crudo)
+        self._nombres.append(entrada.nombre)
+
+    def writestr(self, nombre, datos):
+        self.copiar(_cache.comprimir(nombre, datos, self.nivel))
+
+    def write(self, ruta, nombre):
+        with open(ruta, 'rb') as archivo:
+            self.writestr(nombre, archivo.read())
+
+    def namelist(self):
+        return list(self._nombres)
+
+    def close(self):
+        inicio = self._posicion
+        for registro in self._central:
+            self._escribir(registro)
+        total = len(self._central)
+        if total > 0xFFFF:
+            raise ValueError("El xlsx tiene más entradas de las que admite un zip sin zip64.")
+        self._escribir(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, total, total, self._posicion - inicio, inicio, 0))